@@ -8,6 +8,8 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from database import Base
 
 from user.models.user_models import User
+from fastapi_auth.models.token_models import RevokedToken
+from user.models.outbox_models import OutboxEvent
 
 import logging
 
@@ -0,0 +1,54 @@
+"""index lower(email), drop redundant ix_user_id
+
+Revision ID: b7d41c9e2f60
+Revises: 5c2e8f1a7b3d
+Create Date: 2026-10-18 11:40:07.512934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41c9e2f60'
+down_revision: Union[str, None] = '5c2e8f1a7b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the table writable while the index builds, and cannot
+    # run inside a transaction. It fails if two emails differ only by case; a
+    # failed build leaves an INVALID index that has to be dropped before retrying.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_email_lower',
+            'user',
+            [sa.text('lower(email)')],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_id',
+            table_name='user',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_id',
+            'user',
+            ['id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_email_lower',
+            table_name='user',
+            postgresql_concurrently=True,
+        )
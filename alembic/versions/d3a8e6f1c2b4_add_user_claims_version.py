@@ -0,0 +1,27 @@
+"""add user.claims_version
+
+Revision ID: d3a8e6f1c2b4
+Revises: b7d41c9e2f60
+Create Date: 2026-10-18 13:05:52.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8e6f1c2b4'
+down_revision: Union[str, None] = 'b7d41c9e2f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A constant server default makes this a catalog-only change on PostgreSQL 11+
+    op.add_column('user', sa.Column('claims_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'claims_version')
@@ -0,0 +1,37 @@
+"""create outbox_event table
+
+Revision ID: f1b5c3a9d7e2
+Revises: d3a8e6f1c2b4
+Create Date: 2026-10-18 15:41:09.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b5c3a9d7e2'
+down_revision: Union[str, None] = 'd3a8e6f1c2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox_event',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('event_type', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.Float(), nullable=False),
+    sa.Column('available_at', sa.Float(), nullable=True),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_event_available_at', 'outbox_event', ['available_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_event_available_at', table_name='outbox_event')
+    op.drop_table('outbox_event')
@@ -0,0 +1,65 @@
+import os
+import statistics
+import subprocess
+from typing import Dict, List
+
+# Settings the application modules read at import time. Real values from the
+# environment or a .env file win; these only make the benchmarks self-contained.
+BENCHMARK_ENV = {
+    "ACCESS_TOKEN_SECRET_KEY": "benchmark-access-secret-key-0123456789",
+    "REFRESH_TOKEN_SECRET_KEY": "benchmark-refresh-secret-key-0123456789",
+    "ACCESS_TOKEN_EXPIRE_SECONDS": "900",
+    "REFRESH_TOKEN_EXPIRE_SECONDS": "86400",
+    "DATABASE_PING": "300",
+    # Every benchmark request comes from one client address
+    "LOGIN_RATE_LIMIT_PER_IP": "0",
+    "LOGIN_RATE_LIMIT_PER_EMAIL": "0",
+}
+
+
+def configure_env() -> None:
+    # Must run before any application module is imported
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    # Latency summary in milliseconds
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def metric_total(registry, name: str) -> float:
+    # Sum of every sample of one metric, across all label values
+    total = 0.0
+    for line in registry.render().splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+def git_revision() -> str:
+    # Recorded with saved results so runs can be matched to commits
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
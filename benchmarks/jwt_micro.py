@@ -0,0 +1,380 @@
+"""
+Micro-benchmarks of the JWT encode/decode hot path.
+
+Times `CustomJWTStrategy.write_token`, `JWTBearer.decode_token`,
+`RefreshJWTBearer.decode_token` and `token_expired`, and splits a token into
+the steps pyjwt performs: JSON encode/decode, base64url encode/decode, signing
+and signature verification. Cases cover every supported algorithm, payload
+sizes (extra claims) and audience list lengths.
+
+Each benchmark is calibrated to run for at least --min-time seconds, repeated
+--repeat times with the garbage collector off; the report gives the fastest
+and the median repeat in nanoseconds per operation. Save a run as a baseline
+and compare a later one against it:
+
+    python -m benchmarks.jwt_micro --save benchmarks/baselines/jwt_micro.json
+    python -m benchmarks.jwt_micro --compare benchmarks/baselines/jwt_micro.json
+
+Baselines are only comparable on the same machine and Python version; both are
+recorded in the file.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from benchmarks._common import configure_env, git_revision
+
+configure_env()
+
+import cryptography  # noqa: E402
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa  # noqa: E402
+from jwt.algorithms import get_default_algorithms  # noqa: E402
+from jwt.utils import base64url_decode, base64url_encode  # noqa: E402
+from pydantic import SecretStr  # noqa: E402
+
+from fastapi_auth import custom_dependency  # noqa: E402
+from fastapi_auth.config import get_refresh_jwt_strategy  # noqa: E402
+from fastapi_auth.custom_dependency import JWTBearer, RefreshJWTBearer  # noqa: E402
+from fastapi_auth.keys import ASYMMETRIC_ALGORITHMS, KeySet  # noqa: E402
+from fastapi_auth.utils import CustomJWTStrategy  # noqa: E402
+
+ALGORITHMS = ("HS256",) + ASYMMETRIC_ALGORITHMS
+# Extra claims added to the payload: the app's own tokens are "small"
+PAYLOAD_SIZES = {"small": 0, "medium": 10, "large": 50}
+AUDIENCE_COUNTS = (1, 5, 20)
+AUDIENCE = "fastapi-users:auth"
+
+
+class _BenchUser:
+    id = uuid.UUID("6f1c2a4e-8d1f-4f4e-9a57-1c0b6f2f8a11")
+    is_active = True
+    is_verified = False
+    is_superuser = False
+    claims_version = 0
+
+
+def signing_key(algorithm: str):
+    if algorithm == "HS256":
+        return SecretStr("benchmark-access-secret-key-0123456789")
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def build_claims(extra_claims: int, audiences: int) -> dict:
+    claims = {
+        "sub": str(_BenchUser.id),
+        # The accepted audience goes last, the worst case for the audience check
+        "aud": [f"service-{i}" for i in range(audiences - 1)] + [AUDIENCE],
+        "token_type": "access",
+        "jti": uuid.uuid4().hex,
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+    for i in range(extra_claims):
+        claims[f"claim_{i}"] = f"value-{i}-" + "x" * 16
+    return claims
+
+
+class Runner:
+    def __init__(self, min_time: float, repeat: int):
+        self.min_time = min_time
+        self.repeat = repeat
+        self.loop = asyncio.new_event_loop()
+        self.results: Dict[str, dict] = {}
+
+    def _time(self, func: Callable[[], object], number: int) -> float:
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - started
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def bench(self, name: str, func: Callable[[], object], **info) -> None:
+        # Calibrate like timeit.autorange: grow the loop until it takes min_time
+        func()
+        number = 1
+        while True:
+            elapsed = self._time(func, number)
+            if elapsed >= self.min_time:
+                break
+            number *= 2 if elapsed == 0 else max(2, int(self.min_time / elapsed * 1.2))
+
+        per_op = [self._time(func, number) / number for _ in range(self.repeat)]
+        self.results[name] = {
+            **info,
+            "loops": number,
+            "min_ns": min(per_op) * 1e9,
+            "median_ns": statistics.median(per_op) * 1e9,
+        }
+        print(
+            f"{name:<60} {self.results[name]['median_ns']:>12.0f} ns",
+            file=sys.stderr,
+        )
+
+    def bench_async(self, name: str, coroutine_function, **info) -> None:
+        # The coroutines measured never suspend, so driving them by hand avoids
+        # timing the event loop instead of the code
+        def run():
+            coroutine = coroutine_function()
+            try:
+                coroutine.send(None)
+            except StopIteration as stop:
+                return stop.value
+            raise RuntimeError(f"{name} suspended")
+
+        self.bench(name, run, **info)
+
+
+def bench_components(runner: Runner, algorithm: str, key, size: str, audiences: int):
+    algorithm_object = get_default_algorithms()[algorithm]
+    prepared_key = algorithm_object.prepare_key(
+        key.get_secret_value() if isinstance(key, SecretStr) else key
+    )
+    verify_key = (
+        prepared_key.public_key()
+        if algorithm in ASYMMETRIC_ALGORITHMS
+        else prepared_key
+    )
+
+    claims = build_claims(PAYLOAD_SIZES[size], audiences)
+    token = jwt.encode(
+        claims,
+        key.get_secret_value() if isinstance(key, SecretStr) else key,
+        algorithm=algorithm,
+    )
+    header_segment, payload_segment, signature_segment = token.split(".")
+    signing_input = f"{header_segment}.{payload_segment}".encode()
+    signature = base64url_decode(signature_segment.encode())
+    header_json = base64url_decode(header_segment.encode())
+    payload_json = base64url_decode(payload_segment.encode())
+    payload = json.loads(payload_json)
+
+    info = {
+        "algorithm": algorithm,
+        "payload": size,
+        "audiences": audiences,
+        "token_bytes": len(token),
+    }
+    prefix = f"component/{algorithm}/{size}/aud{audiences}"
+    runner.bench(
+        f"{prefix}/json_encode",
+        lambda: json.dumps(payload, separators=(",", ":")).encode(),
+        **info,
+    )
+    runner.bench(
+        f"{prefix}/base64_encode",
+        lambda: base64url_encode(header_json) + b"." + base64url_encode(payload_json),
+        **info,
+    )
+    runner.bench(
+        f"{prefix}/sign",
+        lambda: algorithm_object.sign(signing_input, prepared_key),
+        **info,
+    )
+    runner.bench(
+        f"{prefix}/base64_decode",
+        lambda: (
+            base64url_decode(header_segment.encode()),
+            base64url_decode(payload_segment.encode()),
+            base64url_decode(signature_segment.encode()),
+        ),
+        **info,
+    )
+    runner.bench(f"{prefix}/json_decode", lambda: json.loads(payload_json), **info)
+    runner.bench(
+        f"{prefix}/verify",
+        lambda: algorithm_object.verify(signing_input, verify_key, signature),
+        **info,
+    )
+    runner.bench(
+        f"{prefix}/pyjwt_decode",
+        lambda: jwt.decode(
+            token, verify_key, audience=[AUDIENCE], algorithms=[algorithm]
+        ),
+        **info,
+    )
+
+
+def bench_functions(runner: Runner, algorithm: str, key, size: str, audiences: int):
+    strategy = CustomJWTStrategy(
+        secret=key,
+        lifetime_seconds=900,
+        algorithm=algorithm,
+        public_key=(key.public_key() if algorithm in ASYMMETRIC_ALGORITHMS else None),
+        key_id=None if algorithm == "HS256" else f"bench-{algorithm.lower()}",
+    )
+    key_set = KeySet(algorithm, key, strategy.key_id)
+    claims = build_claims(PAYLOAD_SIZES[size], audiences)
+    token = jwt.encode(
+        claims,
+        key.get_secret_value() if isinstance(key, SecretStr) else key,
+        algorithm=algorithm,
+        headers=None if strategy.key_id is None else {"kid": strategy.key_id},
+    )
+
+    info = {
+        "algorithm": algorithm,
+        "payload": size,
+        "audiences": audiences,
+        "token_bytes": len(token),
+    }
+    prefix = f"function/{algorithm}/{size}/aud{audiences}"
+    bearer = JWTBearer(token_type="access")
+
+    # decode_token reads the module level key set; swap in the one under test
+    original_key_set = custom_dependency.access_key_set
+    custom_dependency.access_key_set = key_set
+    try:
+        runner.bench_async(
+            f"{prefix}/JWTBearer.decode_token",
+            lambda: bearer.decode_token(token),
+            **info,
+        )
+    finally:
+        custom_dependency.access_key_set = original_key_set
+
+    if size == "small" and audiences == 1:
+        # write_token always produces the same claims, so only algorithms vary
+        runner.bench_async(
+            f"function/{algorithm}/CustomJWTStrategy.write_token",
+            lambda: strategy.write_token(_BenchUser()),
+            algorithm=algorithm,
+        )
+
+
+def bench_refresh_and_expiry(runner: Runner) -> None:
+    bearer = RefreshJWTBearer(token_type="refresh")
+    token = runner.loop.run_until_complete(
+        get_refresh_jwt_strategy().write_token(_BenchUser())
+    )
+    runner.bench_async(
+        "function/HS256/RefreshJWTBearer.decode_token",
+        lambda: bearer.decode_token(token),
+        algorithm="HS256",
+        token_bytes=len(token),
+    )
+
+    claims = runner.loop.run_until_complete(bearer.decode_token(token))
+    access_bearer = JWTBearer(token_type="access")
+    runner.bench(
+        "function/JWTBearer.token_expired",
+        lambda: access_bearer.token_expired(claims),
+    )
+    runner.bench(
+        "function/RefreshJWTBearer.token_expired",
+        lambda: bearer.token_expired(claims),
+    )
+
+
+def cases(algorithms: List[str]):
+    # Every algorithm with the app's own token shape; payload size and audience
+    # sweeps with HS256, where encoding is a larger share of the total
+    for algorithm in algorithms:
+        yield algorithm, "small", 1
+    if "HS256" in algorithms:
+        for size in ("medium", "large"):
+            yield "HS256", size, 1
+        for audiences in AUDIENCE_COUNTS[1:]:
+            yield "HS256", "small", audiences
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[dict]:
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["median_ns"] / before["median_ns"]
+        rows.append(
+            {
+                "name": name,
+                "baseline_ns": round(before["median_ns"]),
+                "current_ns": round(result["median_ns"]),
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def main(args) -> int:
+    runner = Runner(args.min_time, args.repeat)
+    keys = {algorithm: signing_key(algorithm) for algorithm in args.algorithms}
+
+    for algorithm, size, audiences in cases(args.algorithms):
+        if not args.skip_components:
+            bench_components(runner, algorithm, keys[algorithm], size, audiences)
+        bench_functions(runner, algorithm, keys[algorithm], size, audiences)
+    bench_refresh_and_expiry(runner)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "pyjwt": jwt.__version__,
+        "cryptography": cryptography.__version__,
+        "min_time": args.min_time,
+        "repeat": args.repeat,
+        "results": runner.results,
+    }
+    status = 0
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        rows = compare(report, baseline, args.threshold)
+        report["comparison"] = {
+            "baseline": args.compare,
+            "baseline_revision": baseline.get("revision"),
+            "threshold": args.threshold,
+            "rows": rows,
+        }
+        if any(row["regression"] for row in rows):
+            status = 1
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+            output.write("\n")
+
+    print(json.dumps(report, indent=2))
+    runner.loop.close()
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--algorithms", nargs="+", choices=ALGORITHMS, default=list(ALGORITHMS)
+    )
+    parser.add_argument(
+        "--skip-components", action="store_true", help="only time the app functions"
+    )
+    parser.add_argument("--save", help="write the report to this baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown ratio above which a benchmark counts as a regression",
+    )
+    sys.exit(main(parser.parse_args()))
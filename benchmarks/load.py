@@ -0,0 +1,229 @@
+"""
+End-to-end load benchmark of the auth endpoints.
+
+Boots `main:app` in-process with its lifespan, against a fresh aiosqlite
+database (or DATABASE_URL when --database-url is given), seeds users directly
+in the table and drives each endpoint in turn at the requested concurrency.
+Per endpoint it reports throughput, latency percentiles and database pool
+checkouts per request, read from the /metrics registry.
+
+    python -m benchmarks.load --users 500 --requests 1000 --concurrency 32 \\
+        --output load-$(git rev-parse --short HEAD).json
+    python -m benchmarks.load --compare load-abc1234.json
+
+Password hashing dominates register and login; use --hash-requests to keep
+those phases short without shrinking the others.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks._common import configure_env, git_revision, metric_total, percentiles
+
+configure_env()
+
+if "--database-url" not in sys.argv:
+    _workdir = tempfile.mkdtemp(prefix="load-benchmark-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/load.db"
+else:
+    os.environ["DATABASE_URL"] = sys.argv[sys.argv.index("--database-url") + 1]
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+import database  # noqa: E402
+from fastapi_auth.config import (  # noqa: E402
+    get_access_jwt_strategy,
+    get_refresh_jwt_strategy,
+)
+from main import app  # noqa: E402
+from metrics import registry  # noqa: E402
+from user.models.user_models import User  # noqa: E402
+from user.password import password_helper  # noqa: E402
+
+ENDPOINTS = ("register", "login", "refresh", "verify", "protected", "delete_me")
+
+
+class SeededUser:
+    def __init__(self, index: int):
+        self.id = uuid.uuid4()
+        self.email = f"load-{index}@example.com"
+        # Same flags as the seeded row, for the claims embedded in access tokens
+        self.is_active = True
+        self.is_verified = False
+        self.is_superuser = False
+        self.claims_version = 0
+        self.access_token = None
+        self.refresh_token = None
+
+
+async def seed(count: int, password: str) -> list:
+    # One hash for everyone: seeding measures nothing and bcrypt is slow
+    hashed_password = password_helper.hash(password)
+    users = [SeededUser(index) for index in range(count)]
+    async with database.engine.begin() as connection:
+        await connection.execute(
+            insert(User.__table__),
+            [
+                {
+                    "id": user.id,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": False,
+                }
+                for user in users
+            ],
+        )
+
+    for user in users:
+        user.access_token = await get_access_jwt_strategy().write_token(user)
+        user.refresh_token = await get_refresh_jwt_strategy().write_token(user)
+    return users
+
+
+def build_request(endpoint: str, index: int, users: list, args):
+    user = users[index % len(users)]
+    if endpoint == "register":
+        body = {"email": f"register-{uuid.uuid4().hex}@example.com"}
+        return "POST", "/auth/register", {"json": {**body, "password": args.password}}
+    if endpoint == "login":
+        data = {"username": user.email, "password": args.password}
+        return "POST", "/auth/jwt/login", {"data": data}
+    if endpoint == "refresh":
+        headers = {"Authorization": f"Bearer {user.refresh_token}"}
+        return "POST", "/auth/jwt/refresh", {"headers": headers}
+    if endpoint == "verify":
+        headers = {"Authorization": f"Bearer {user.access_token}"}
+        return "GET", "/auth/jwt/verify", {"headers": headers}
+    if endpoint == "protected":
+        headers = {"Authorization": f"Bearer {user.access_token}"}
+        return "GET", "/user/protected-route-only-jwt", {"headers": headers}
+    if endpoint == "delete_me":
+        # Every delete needs a user of its own, taken from the end of the list
+        user = users[len(users) - 1 - index]
+        headers = {"Authorization": f"Bearer {user.access_token}"}
+        return "DELETE", "/user/me", {"headers": headers}
+    raise ValueError(endpoint)
+
+
+def request_count(endpoint: str, users: list, args) -> int:
+    if endpoint in ("register", "login"):
+        return args.hash_requests
+    if endpoint == "delete_me":
+        return min(args.requests, len(users))
+    return args.requests
+
+
+async def run_endpoint(client, endpoint: str, users: list, args) -> dict:
+    total = request_count(endpoint, users, args)
+    latencies = []
+    statuses = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            method, url, kwargs = build_request(endpoint, index, users, args)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    checkouts_before = metric_total(registry, "db_pool_checkouts_total")
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    checkouts = metric_total(registry, "db_pool_checkouts_total") - checkouts_before
+
+    return {
+        "endpoint": endpoint,
+        "requests": total,
+        "errors": sum(count for code, count in statuses.items() if code >= 400),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "requests_per_second": total / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+        "pool_checkouts_per_request": checkouts / total if total else 0.0,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list:
+    previous = {result["endpoint"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result["endpoint"])
+        if before is None or not before["requests_per_second"]:
+            continue
+        rows.append(
+            {
+                "endpoint": result["endpoint"],
+                "throughput_ratio": result["requests_per_second"]
+                / before["requests_per_second"],
+                "p95_ratio": result["latency"].get("p95_ms", 0)
+                / (before["latency"].get("p95_ms") or 1),
+                "pool_checkouts_per_request": [
+                    before["pool_checkouts_per_request"],
+                    result["pool_checkouts_per_request"],
+                ],
+            }
+        )
+    return rows
+
+
+async def main(args) -> None:
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+    users = await seed(args.users, args.password)
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app", timeout=None
+        ) as client:
+            for endpoint in ENDPOINTS:
+                if endpoint in args.endpoints:
+                    results.append(await run_endpoint(client, endpoint, users, args))
+
+    report = {
+        "revision": git_revision(),
+        "database": database.engine.url.render_as_string(hide_password=True),
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["comparison"] = {
+                "baseline": args.compare,
+                "endpoints": compare(report, json.load(baseline)),
+            }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--hash-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--password", default="correct horse battery staple")
+    parser.add_argument(
+        "--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS)
+    )
+    parser.add_argument("--database-url", help="use this database instead of SQLite")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--compare", help="report saved by a previous run")
+    asyncio.run(main(parser.parse_args()))
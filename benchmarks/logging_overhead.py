@@ -0,0 +1,140 @@
+"""
+Requests per second on `/auth/jwt/verify` under each logging configuration.
+
+The app runs in-process (httpx ASGI transport) against a temporary SQLite file
+with the user cache disabled, so every request runs one SELECT that SQL logging
+can see. All output goes to os.devnull, which makes this a lower bound of the
+cost of synchronous logging; a real terminal or pipe is slower. Modes:
+
+- legacy: the old setup, `echo=True` style SQL logging plus root INFO handler,
+  both writing synchronously on the event loop
+- queued: the logging_config defaults, JSON through the queue, SQL at WARNING
+- queued_sql_sampled: as queued, with SQL at INFO sampled at 1%
+
+    python -m benchmarks.logging_overhead --requests 3000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks._common import configure_env, percentiles
+
+configure_env()
+
+_workdir = tempfile.mkdtemp(prefix="logging-overhead-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/bench.db"
+os.environ["USER_CACHE_MAX_SIZE"] = "0"
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+import httpx  # noqa: E402
+
+import database  # noqa: E402
+from logging_config import logging_setup  # noqa: E402
+from main import app  # noqa: E402
+
+MODES = ("legacy", "queued", "queued_sql_sampled")
+
+
+def _reset_logging() -> None:
+    logging_setup.shutdown()
+    for name in ("", "sqlalchemy.engine", "sqlalchemy.engine.Engine"):
+        logger = logging.getLogger(name)
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+
+
+def configure_mode(mode: str, devnull) -> None:
+    _reset_logging()
+    if mode == "legacy":
+        # logging.basicConfig(level=INFO) in main.py, sqlalchemy.engine at INFO in
+        # database.py and the handler echo=True adds to the engine logger
+        root = logging.getLogger()
+        root.addHandler(logging.StreamHandler(devnull))
+        root.setLevel(logging.INFO)
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+        echo_handler = logging.StreamHandler(devnull)
+        echo_handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+        )
+        logging.getLogger("sqlalchemy.engine.Engine").addHandler(echo_handler)
+    elif mode == "queued":
+        logging_setup.configure(stream=devnull)
+    elif mode == "queued_sql_sampled":
+        logging_setup.configure(
+            levels={"sqlalchemy.engine": "INFO"},
+            sample_rates={"sqlalchemy.engine": 0.01},
+            stream=devnull,
+        )
+
+
+async def run_mode(client, headers, mode: str, args, devnull) -> dict:
+    configure_mode(mode, devnull)
+    # Warm-up so connection setup is not measured
+    for _ in range(50):
+        await client.get("/auth/jwt/verify", headers=headers)
+
+    latencies = []
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.get("/auth/jwt/verify", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = logging_setup.stats() if mode != "legacy" else {}
+    _reset_logging()
+
+    return {
+        "mode": mode,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency": percentiles(latencies),
+        **({"log_queue": stats} if stats else {}),
+    }
+
+
+async def main(args) -> None:
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    with open(os.devnull, "w") as devnull:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app"
+        ) as client:
+            credentials = {"email": "bench@example.com", "password": "benchmark-pw"}
+            await client.post("/auth/register", json=credentials)
+            response = await client.post(
+                "/auth/jwt/login",
+                data={"username": credentials["email"], "password": "benchmark-pw"},
+            )
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            for _ in range(args.rounds):
+                for mode in args.modes:
+                    results.append(await run_mode(client, headers, mode, args, devnull))
+
+    await database.engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    asyncio.run(main(parser.parse_args()))
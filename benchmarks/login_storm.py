@@ -0,0 +1,114 @@
+"""
+Token verification latency while a burst of logins hashes passwords.
+
+Runs the same login storm twice: once with bcrypt inline on the event loop
+(the old behaviour, PASSWORD_HASH_WORKERS=0) and once through the process
+pool. Meanwhile a ticker performs the work of `/auth/jwt/verify` (decode and
+check an access token) every few milliseconds and records how long each one
+took from the moment it was due.
+
+    python -m benchmarks.login_storm --logins 200 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks._common import configure_env, percentiles
+
+configure_env()
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi_users.password import PasswordHelper  # noqa: E402
+from fastapi_auth.custom_dependency import JWTBearer  # noqa: E402
+from fastapi_auth.config import get_access_jwt_strategy  # noqa: E402
+from user.password import ExecutorPasswordHelper, PasswordHashingExecutor  # noqa: E402
+
+
+class _BenchUser:
+    id = "6f1c2a4e-8d1f-4f4e-9a57-1c0b6f2f8a11"
+    is_active = True
+    is_verified = False
+    is_superuser = False
+    claims_version = 0
+
+
+async def _verify_ticker(token: str, stop: asyncio.Event, interval: float) -> list:
+    bearer = JWTBearer(token_type="access")
+    samples = []
+    due = time.perf_counter()
+    while not stop.is_set():
+        due += interval
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        # Bypass the verified-token cache: measure a full decode every time
+        token_data = await bearer.decode_token(token)
+        bearer.token_expired(token_data)
+        samples.append(time.perf_counter() - due)
+    return samples
+
+
+async def _run_storm(args, workers: int, token: str, hashed: str) -> dict:
+    executor = PasswordHashingExecutor(
+        max_workers=workers,
+        max_concurrency=max(workers, 1),
+        max_queue=args.queue,
+    )
+    helper = ExecutorPasswordHelper(executor)
+    # Warm the pool so process start-up is not billed to the storm
+    await helper.verify_and_update_async(args.password, hashed)
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_verify_ticker(token, stop, args.interval / 1000))
+    await asyncio.sleep(args.interval / 1000)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    login_latencies = []
+
+    async def login():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await helper.verify_and_update_async(args.password, hashed)
+            except HTTPException:
+                return
+            login_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    verify_samples = await ticker
+    executor.shutdown()
+
+    return {
+        "mode": "process_pool" if workers else "inline",
+        "workers": workers,
+        "logins": args.logins,
+        "logins_per_second": len(login_latencies) / elapsed,
+        "rejected": executor.rejected,
+        "login_latency": percentiles(login_latencies),
+        "verify_delay": percentiles(verify_samples),
+    }
+
+
+async def main(args) -> None:
+    token = await get_access_jwt_strategy().write_token(_BenchUser())
+    hashed = PasswordHelper().hash(args.password)
+
+    results = [
+        await _run_storm(args, 0, token, hashed),
+        await _run_storm(args, args.workers, token, hashed),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--interval", type=float, default=5.0, help="ms")
+    parser.add_argument("--password", default="correct horse battery staple")
+    asyncio.run(main(parser.parse_args()))
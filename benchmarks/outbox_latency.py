@@ -0,0 +1,108 @@
+"""
+Checks that slow registration side effects stay out of `/auth/register`.
+
+Boots `main:app` against a fresh SQLite file and replaces the registration
+handler with one that sleeps --handler-delay seconds and fails every
+--fail-every-th call. Registers --users users, waits for the outbox worker to
+drain and reports register latency next to the delivery lag. Exits non-zero if
+register p95 gets anywhere near the handler delay, or if any event was lost or
+delivered more often than its retries explain.
+
+    python -m benchmarks.outbox_latency
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks._common import configure_env, percentiles
+
+configure_env()
+
+_workdir = tempfile.mkdtemp(prefix="outbox-latency-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/outbox.db"
+os.environ.setdefault("PASSWORD_HASH_FLOOR_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_MIN_ROUNDS", "4")
+os.environ.setdefault("OUTBOX_RETRY_BASE_SECONDS", "0.05")
+os.environ.setdefault("OUTBOX_POLL_SECONDS", "0.05")
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+from user.models.outbox_models import OutboxEvent  # noqa: E402
+from user.outbox import handler  # noqa: E402
+from user.user_manager import USER_REGISTERED  # noqa: E402
+
+calls = 0
+delivered = {}
+
+
+async def main(args) -> int:
+    @handler(USER_REGISTERED)
+    async def slow_handler(payload):
+        global calls
+        calls += 1
+        await asyncio.sleep(args.handler_delay)
+        if args.fail_every and calls % args.fail_every == 0:
+            raise RuntimeError("downstream unavailable")
+        delivered[payload["user_id"]] = delivered.get(payload["user_id"], 0) + 1
+
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+
+    latencies = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as c:
+            for index in range(args.users):
+                started = time.perf_counter()
+                response = await c.post(
+                    "/auth/register",
+                    json={"email": f"outbox-{index}@example.com", "password": "pw"},
+                )
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline:
+            async with database.AsyncSessionLocal() as session:
+                pending = await session.scalar(
+                    select(func.count()).select_from(OutboxEvent)
+                )
+            if not pending:
+                break
+            await asyncio.sleep(0.05)
+
+    await database.engine.dispose()
+    register = percentiles(latencies)
+    result = {
+        "register": register,
+        "handler_delay_ms": args.handler_delay * 1000,
+        "handler_calls": calls,
+        "delivered": len(delivered),
+        "pending": pending,
+    }
+    print(json.dumps(result, indent=2))
+    passed = (
+        register["p95_ms"] < args.handler_delay * 1000 / 2
+        and pending == 0
+        and len(delivered) == args.users
+        and all(count == 1 for count in delivered.values())
+    )
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--handler-delay", type=float, default=0.5)
+    parser.add_argument("--fail-every", type=int, default=7)
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    sys.exit(asyncio.run(main(parser.parse_args())))
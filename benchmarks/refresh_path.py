@@ -0,0 +1,112 @@
+"""
+Throughput of the `/auth/jwt/refresh` token pipeline, old versus current.
+
+The legacy pipeline decodes the refresh token in the dependency, decodes it
+again in `JWTStrategy.read_token` and builds a new access strategy (and
+SecretStr) to sign. The current one decodes once and signs with the shared
+strategy. User loading is served from memory in both so only token work is
+measured.
+
+    python -m benchmarks.refresh_path --iterations 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from benchmarks._common import configure_env
+
+configure_env()
+
+from pydantic import SecretStr  # noqa: E402
+from fastapi_auth import config  # noqa: E402
+from fastapi_auth.custom_dependency import RefreshJWTBearer  # noqa: E402
+from fastapi_auth.utils import CustomJWTStrategy, get_token_user  # noqa: E402
+
+
+class _BenchUser:
+    def __init__(self):
+        self.id = uuid.UUID("6f1c2a4e-8d1f-4f4e-9a57-1c0b6f2f8a11")
+        self.is_active = True
+        self.is_verified = False
+        self.is_superuser = False
+        self.claims_version = 0
+
+
+class _InMemoryUserManager:
+    # Just enough of UserManager for read_token and get_token_user
+    def __init__(self, user):
+        self.user = user
+
+    def parse_id(self, value):
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+
+    async def get(self, id):
+        return self.user
+
+
+async def legacy_refresh(bearer, token, user_manager):
+    token_data = await bearer.decode_token(token)
+    bearer.token_expired(token_data)
+
+    refresh_strategy = CustomJWTStrategy(
+        secret=SecretStr(config.REFRESH_TOKEN_SECRET_KEY),
+        lifetime_seconds=config.REFRESH_TOKEN_EXPIRE_SECONDS,
+        token_type="refresh",
+    )
+    user = await refresh_strategy.read_token(token, user_manager)
+    access_strategy = CustomJWTStrategy(
+        secret=SecretStr(config.ACCESS_TOKEN_SECRET_KEY),
+        lifetime_seconds=config.ACCESS_TOKEN_EXPIRE_SECONDS,
+        token_type="access",
+    )
+    return await access_strategy.write_token(user)
+
+
+async def current_refresh(bearer, token, user_manager):
+    token_data = await bearer.decode_token(token)
+    bearer.token_expired(token_data)
+
+    user = await get_token_user(token_data, user_manager)
+    return await config.get_access_jwt_strategy().write_token(user)
+
+
+async def measure(pipeline, iterations, bearer, token, user_manager) -> float:
+    # Warm-up, then the timed loop
+    for _ in range(min(iterations, 500)):
+        await pipeline(bearer, token, user_manager)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await pipeline(bearer, token, user_manager)
+    return iterations / (time.perf_counter() - started)
+
+
+async def main(args) -> None:
+    user = _BenchUser()
+    user_manager = _InMemoryUserManager(user)
+    bearer = RefreshJWTBearer(token_type="refresh")
+    token = await config.get_refresh_jwt_strategy().write_token(user)
+
+    legacy = await measure(legacy_refresh, args.iterations, bearer, token, user_manager)
+    current = await measure(
+        current_refresh, args.iterations, bearer, token, user_manager
+    )
+    print(
+        json.dumps(
+            {
+                "iterations": args.iterations,
+                "legacy_refreshes_per_second": legacy,
+                "current_refreshes_per_second": current,
+                "speedup": current / legacy,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,174 @@
+import logging
+import time
+from typing import Callable, Optional
+
+from decouple import config
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from database import engine, replica_engines, replicas
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between health checks. A check only pings when no statement succeeded
+# within the last interval, since live traffic already proves the database is up.
+DATABASE_PING = config("DATABASE_PING", cast=int)
+# Pooled connections idle for longer than this are replaced on checkout instead of
+# being handed to a request, which catches connections a firewall or the server
+# silently dropped (0 disables the sweep)
+DATABASE_IDLE_TIMEOUT = config("DATABASE_IDLE_TIMEOUT", default=300, cast=int)
+
+
+class PoolHealthMonitor:
+    """
+    Tracks whether an engine's database is reachable, for the readiness endpoint.
+
+    Successful statements mark the database healthy for free; `check` only pings
+    when the engine has been quiet. Disconnect errors raised by requests mark it
+    unhealthy immediately, and a failed ping discards every idle connection.
+    `on_change(name, healthy)` is called on every transition.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        name: str = "primary",
+        ping_interval: int = DATABASE_PING,
+        idle_timeout: int = DATABASE_IDLE_TIMEOUT,
+        on_change: Optional[Callable[[str, bool], None]] = None,
+    ):
+        self.engine = engine
+        self.name = name
+        self.on_change = on_change
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+
+        self.healthy: Optional[bool] = None
+        self.last_ok_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.pings = 0
+        self.skipped_pings = 0
+        self.idle_recycled = 0
+
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "after_cursor_execute", self._on_statement)
+        event.listen(sync_engine, "handle_error", self._on_error)
+        event.listen(sync_engine.pool, "checkin", self._on_checkin)
+        event.listen(sync_engine.pool, "checkout", self._on_checkout)
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, many):
+        self.last_ok_at = time.monotonic()
+        if not self.healthy:
+            self._mark_healthy()
+
+    def _on_error(self, exception_context):
+        if exception_context.is_disconnect:
+            self._mark_unhealthy(str(exception_context.original_exception))
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if (
+            self.idle_timeout
+            and checked_in_at is not None
+            and time.monotonic() - checked_in_at > self.idle_timeout
+        ):
+            self.idle_recycled += 1
+            # The pool discards this connection and retries with a fresh one
+            raise exc.DisconnectionError("Connection idle for too long")
+
+    def _mark_healthy(self) -> None:
+        if self.healthy is False:
+            logger.warning("Database %s is reachable again.", self.name)
+        if self.healthy is not True and self.on_change is not None:
+            self.on_change(self.name, True)
+        self.healthy = True
+        self.last_error = None
+        self.consecutive_failures = 0
+
+    def _mark_unhealthy(self, error: str) -> None:
+        if self.healthy is not False:
+            logger.error("Database %s is unreachable: %s", self.name, error)
+            if self.on_change is not None:
+                self.on_change(self.name, False)
+        self.healthy = False
+        self.last_error = error
+        self.consecutive_failures += 1
+
+    async def check(self) -> None:
+        if (
+            self.healthy
+            and self.last_ok_at is not None
+            and time.monotonic() - self.last_ok_at < self.ping_interval
+        ):
+            self.skipped_pings += 1
+            logger.debug("Skipping ping of %s, traffic is flowing.", self.name)
+            return
+
+        self.pings += 1
+        try:
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        except Exception as e:
+            self._mark_unhealthy(str(e))
+            # Idle connections are most likely dead too, so drop them now rather
+            # than let requests discover that one checkout at a time
+            await self.engine.dispose()
+            return
+
+        logger.debug("Ping of %s succeeded.", self.name)
+
+    def state(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": bool(self.healthy),
+            "seconds_since_last_ok": (
+                None
+                if self.last_ok_at is None
+                else round(time.monotonic() - self.last_ok_at, 3)
+            ),
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+            "pings": self.pings,
+            "skipped_pings": self.skipped_pings,
+            "idle_recycled": self.idle_recycled,
+        }
+
+
+pool_health = PoolHealthMonitor(engine)
+# Unhealthy replicas are taken out of the read rotation until they answer again
+replica_health = [
+    PoolHealthMonitor(replica_engine, name, on_change=replicas.mark)
+    for name, replica_engine in replica_engines.items()
+]
+monitors = [pool_health, *replica_health]
+
+
+async def check_all() -> None:
+    for monitor in monitors:
+        await monitor.check()
+
+
+registry.callback(
+    "db_healthy",
+    "1 while the database answered the last check or statement, else 0.",
+    lambda: [((monitor.name,), 1 if monitor.healthy else 0) for monitor in monitors],
+    labels=("engine",),
+)
+registry.callback(
+    "db_idle_connections_recycled_total",
+    "Pooled connections replaced on checkout because they sat idle too long.",
+    lambda: [((monitor.name,), monitor.idle_recycled) for monitor in monitors],
+    labels=("engine",),
+    type="counter",
+)
+registry.callback(
+    "db_replica_fallbacks_total",
+    "Read sessions sent to the primary because no replica was healthy.",
+    lambda: replicas.fallbacks,
+    type="counter",
+)
@@ -1,11 +1,18 @@
 # from main import app
+from fastapi import Depends, HTTPException, Request
 from fastapi_users import FastAPIUsers
-from user.user_manager import get_user_manager
-from fastapi_auth.config import access_auth_backend, refresh_auth_backend
+from user.user_manager import get_read_user_manager, get_user_manager, UserManager
+from fastapi_auth.custom_dependency import access_bearer
+from fastapi_auth.utils import get_token_user
+from fastapi_auth.claims import CLAIM_FLAGS, CLAIMS_AUTHORIZATIONS, fresh_claims
+from fastapi_auth.config import (
+    ACCESS_TOKEN_EXPIRE_SECONDS,
+    access_auth_backend,
+    refresh_auth_backend,
+)
 from user.models.user_models import User
 import uuid
 
-
 # Create a FastAPIUsers instance with both access and refresh backends
 fastapi_users = FastAPIUsers[User, uuid.UUID](
     get_user_manager,
@@ -17,3 +24,63 @@ fastapi_users = FastAPIUsers[User, uuid.UUID](
 
 
 get_current_active_user = fastapi_users.current_user(active=True)
+
+
+# Admin routes: the same token checks as every other route (revocation included),
+# then the user must still be active and a superuser
+async def get_current_superuser(
+    request: Request,
+    payload: dict = Depends(access_bearer),
+    user_manager_instance: UserManager = Depends(get_read_user_manager),
+):
+    user = await get_token_user(payload, user_manager_instance, request)
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="Inactive user")
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Superuser privileges required")
+    return user
+
+
+class ClaimsAuthorizer:
+    """
+    Authorizes from the flags embedded in the access token, without touching the
+    database while they are fresh (see `fresh_claims`). Tokens without flags,
+    older ones and those of users whose claims changed since are checked against
+    the user instead. Returns the verified claims.
+    """
+
+    def __init__(
+        self, active: bool = True, verified: bool = False, superuser: bool = False
+    ):
+        self.active = active
+        self.verified = verified
+        self.superuser = superuser
+
+    async def __call__(
+        self,
+        request: Request,
+        payload: dict = Depends(access_bearer),
+        user_manager_instance: UserManager = Depends(get_read_user_manager),
+    ) -> dict:
+        # The session behind the user manager is lazy: no connection is checked
+        # out unless the claims turn out to be stale
+        if fresh_claims(payload, ACCESS_TOKEN_EXPIRE_SECONDS):
+            flags = payload
+            CLAIMS_AUTHORIZATIONS.inc("token")
+        else:
+            user = await get_token_user(payload, user_manager_instance, request)
+            flags = {name: getattr(user, name) for name in CLAIM_FLAGS}
+            CLAIMS_AUTHORIZATIONS.inc("database")
+
+        if self.active and not flags["is_active"]:
+            raise HTTPException(status_code=401, detail="Inactive user")
+        if self.verified and not flags["is_verified"]:
+            raise HTTPException(status_code=403, detail="Unverified user")
+        if self.superuser and not flags["is_superuser"]:
+            raise HTTPException(status_code=403, detail="Superuser privileges required")
+        return payload
+
+
+# Shared instances, so stacking them on one route still authorizes once
+token_claims = ClaimsAuthorizer(active=False)
+active_user_claims = ClaimsAuthorizer(active=True)
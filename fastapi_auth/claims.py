@@ -0,0 +1,71 @@
+import time
+from typing import Any, Dict, Optional
+
+from decouple import config
+
+from fastapi_auth.cache import ExpiringLRUCache
+from metrics import registry
+
+# Put the user's flags and claims version in access tokens
+ACCESS_TOKEN_EMBED_CLAIMS = config("ACCESS_TOKEN_EMBED_CLAIMS", default=True, cast=bool)
+# Embedded flags are trusted for this long after the token was issued; older
+# tokens are checked against the user row. This bounds how long a change made
+# by another worker can go unnoticed.
+CLAIMS_MAX_AGE_SECONDS = config("CLAIMS_MAX_AGE_SECONDS", default=60, cast=int)
+# Users whose latest claims version this process knows
+CLAIMS_VERSION_CACHE_MAX_SIZE = config(
+    "CLAIMS_VERSION_CACHE_MAX_SIZE", default=100000, cast=int
+)
+
+CLAIM_FLAGS = ("is_active", "is_verified", "is_superuser")
+# Stands in for the version of a deleted user: no token is fresh against it
+DELETED_VERSION = float("inf")
+
+CLAIMS_AUTHORIZATIONS = registry.counter(
+    "claims_authorizations_total",
+    "Requests authorized by the claims authorizer, by where the flags came from.",
+    ("source",),
+)
+
+# Keyed by the user id as it appears in `sub`. Entries only need to outlive the
+# tokens that are still trusted, i.e. CLAIMS_MAX_AGE_SECONDS.
+known_versions = ExpiringLRUCache(max_size=CLAIMS_VERSION_CACHE_MAX_SIZE)
+
+
+def embedded_claims(user: Any) -> Dict[str, Any]:
+    claims = {name: bool(getattr(user, name)) for name in CLAIM_FLAGS}
+    claims["claims_version"] = getattr(user, "claims_version", None) or 0
+    return claims
+
+
+def note_version(user_id: Any, version: float) -> None:
+    # Versions only grow, so never replace a newer one with an older read
+    key = str(user_id)
+    known = known_versions.get(key)
+    if known is None or version > known:
+        known_versions.set(key, version, time.time() + CLAIMS_MAX_AGE_SECONDS)
+
+
+def fresh_claims(
+    payload: Dict[str, Any],
+    lifetime_seconds: Optional[int],
+    now: Optional[float] = None,
+) -> bool:
+    """
+    True when the token's embedded flags can be used without a database check:
+    it carries them, was issued within CLAIMS_MAX_AGE_SECONDS and no newer
+    claims version of its user is known to this process.
+    """
+    version = payload.get("claims_version")
+    if version is None or any(name not in payload for name in CLAIM_FLAGS):
+        return False
+
+    now = time.time() if now is None else now
+    exp = payload.get("exp")
+    if not lifetime_seconds or exp is None:
+        return False
+    if exp - lifetime_seconds < now - CLAIMS_MAX_AGE_SECONDS:
+        return False
+
+    known = known_versions.get(str(payload.get("sub")), now)
+    return known is None or known <= version
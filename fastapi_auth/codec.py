@@ -0,0 +1,191 @@
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Collection, Dict, Optional
+
+import jwt
+from fastapi_users.jwt import SecretType, _get_secret_value
+from jwt.utils import base64url_decode, base64url_encode
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+# Claims whose checks the fast path leaves to pyjwt; our own tokens never carry them
+_PYJWT_CLAIMS = ("nbf", "iss")
+
+
+class InvalidTokenTypeError(jwt.InvalidTokenError):
+    pass
+
+
+def _dumps(payload: Dict[str, Any]) -> bytes:
+    # Same bytes as pyjwt's json.dumps(..., separators=(",", ":")) for ASCII
+    # content; anything else is escaped by the standard library like pyjwt does
+    if orjson is not None:
+        encoded = orjson.dumps(payload)
+        if encoded.isascii():
+            return encoded
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few inputs json accepts (e.g. integers over 64 bits)
+            pass
+    return json.loads(data)
+
+
+class HMACTokenCodec:
+    """
+    Encodes and verifies HMAC-signed JWTs for one key, byte for byte like pyjwt.
+
+    The keyed HMAC state and the encoded header segment are built once; tokens
+    only pay for hashing their own payload. Verification checks the signature,
+    `iat`, `exp`, `aud` and `token_type` in one pass, allowing `leeway` seconds of
+    clock skew like pyjwt's option of that name. Tokens whose header differs from
+    ours, or that carry claims the fast path does not handle, go through pyjwt.
+    """
+
+    def __init__(
+        self,
+        secret: SecretType,
+        algorithm: str = "HS256",
+        key_id: Optional[str] = None,
+        leeway: float = 0,
+    ):
+        if algorithm not in HMAC_DIGESTS:
+            raise ValueError(f"HMACTokenCodec does not support {algorithm}")
+        self.algorithm = algorithm
+        self.key_id = key_id
+        self.leeway = leeway
+        self._key = _get_secret_value(secret).encode()
+        self._hmac = hmac.new(self._key, digestmod=HMAC_DIGESTS[algorithm])
+
+        # pyjwt sorts header keys by default
+        header = {"alg": algorithm, "typ": "JWT"}
+        if key_id is not None:
+            header["kid"] = key_id
+        self.header_segment = base64url_encode(
+            json.dumps(header, separators=(",", ":"), sort_keys=True).encode()
+        )
+        self._header_prefix = self.header_segment + b"."
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        mac = self._hmac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        # `exp` must already be an integer timestamp
+        signing_input = self._header_prefix + base64url_encode(_dumps(payload))
+        signature = base64url_encode(self._sign(signing_input))
+        return (signing_input + b"." + signature).decode()
+
+    def decode(
+        self,
+        token: str,
+        audience: Collection[str],
+        token_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        encoded = token.encode() if isinstance(token, str) else token
+        signing_input, _, signature_segment = encoded.rpartition(b".")
+        if not signing_input.startswith(self._header_prefix):
+            return self._decode_with_pyjwt(token, audience, token_type)
+        payload_segment = signing_input[len(self._header_prefix) :]
+        if b"." in payload_segment:
+            return self._decode_with_pyjwt(token, audience, token_type)
+
+        expected = self._sign(signing_input)
+        if not hmac.compare_digest(base64url_encode(expected), signature_segment):
+            # pyjwt tolerates non canonical base64, so compare the raw bytes too
+            try:
+                signature = base64url_decode(signature_segment)
+            except (TypeError, binascii.Error):
+                raise jwt.DecodeError("Invalid crypto padding")
+            if not hmac.compare_digest(expected, signature):
+                raise jwt.InvalidSignatureError("Signature verification failed")
+
+        try:
+            payload = _loads(base64url_decode(payload_segment))
+        except (TypeError, binascii.Error):
+            raise jwt.DecodeError("Invalid payload padding")
+        except ValueError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}")
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+
+        if any(claim in payload for claim in _PYJWT_CLAIMS):
+            return self._decode_with_pyjwt(token, audience, token_type)
+        return self._validate(payload, audience, token_type)
+
+    def _validate(
+        self,
+        payload: Dict[str, Any],
+        audience: Collection[str],
+        token_type: Optional[str],
+    ) -> Dict[str, Any]:
+        # Same checks, order and messages as pyjwt's iat, exp and aud validation
+        now = time.time()
+        if "iat" in payload:
+            try:
+                iat = int(payload["iat"])
+            except ValueError:
+                raise jwt.InvalidIssuedAtError(
+                    "Issued At claim (iat) must be an integer."
+                )
+            if iat > now + self.leeway:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+
+        if "exp" in payload:
+            try:
+                exp = int(payload["exp"])
+            except ValueError:
+                raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.")
+            if exp <= now - self.leeway:
+                raise jwt.ExpiredSignatureError("Signature has expired")
+
+        claims = payload.get("aud")
+        if not claims:
+            raise jwt.MissingRequiredClaimError("aud")
+        if isinstance(claims, str):
+            claims = [claims]
+        if not isinstance(claims, list) or not all(
+            isinstance(claim, str) for claim in claims
+        ):
+            raise jwt.InvalidAudienceError("Invalid claim format in token")
+        if all(expected not in claims for expected in audience):
+            raise jwt.InvalidAudienceError("Audience doesn't match")
+
+        if token_type is not None and payload.get("token_type") != token_type:
+            raise InvalidTokenTypeError("Invalid token type")
+        return payload
+
+    def _decode_with_pyjwt(
+        self,
+        token: str,
+        audience: Collection[str],
+        token_type: Optional[str],
+    ) -> Dict[str, Any]:
+        payload = jwt.decode(
+            token,
+            self._key,
+            audience=list(audience),
+            algorithms=[self.algorithm],
+            leeway=self.leeway,
+        )
+        if token_type is not None and payload.get("token_type") != token_type:
+            raise InvalidTokenTypeError("Invalid token type")
+        return payload
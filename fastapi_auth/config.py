@@ -1,5 +1,6 @@
 from fastapi_users.authentication import AuthenticationBackend
 from fastapi_auth.utils import CustomJWTStrategy
+from fastapi_auth.keys import access_key_set
 from fastapi_users.authentication.transport import BearerTransport
 from decouple import config
 from pydantic import SecretStr
@@ -16,26 +17,34 @@ REFRESH_TOKEN_EXPIRE_SECONDS = config("REFRESH_TOKEN_EXPIRE_SECONDS", cast=int)
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
-# Create the JWT strategy for access tokens
+# Create the JWT strategy for access tokens, signed with the current key of the
+# access key set (ACCESS_TOKEN_SECRET_KEY unless an asymmetric algorithm is set)
+access_jwt_strategy = CustomJWTStrategy(
+    secret=access_key_set.signing_key,
+    lifetime_seconds=ACCESS_TOKEN_EXPIRE_SECONDS,
+    algorithm=access_key_set.algorithm,
+    public_key=access_key_set.public_key,
+    token_type="access",  # Specify it's for access tokens
+    key_id=access_key_set.signing_key_id,
+)
+
+# Create the JWT strategy for refresh tokens. Refresh tokens are only ever read
+# by this service, so they stay on the shared HS256 secret.
+refresh_jwt_strategy = CustomJWTStrategy(
+    secret=SecretStr(REFRESH_TOKEN_SECRET_KEY),  # Use SecretStr for enhanced security
+    lifetime_seconds=REFRESH_TOKEN_EXPIRE_SECONDS,
+    token_type="refresh",  # Specify it's for refresh tokens
+)
+
+
+# Strategies hold no per-request state, so the backends share one long-lived
+# instance each instead of rebuilding the strategy and its key on every call
 def get_access_jwt_strategy() -> CustomJWTStrategy:
-    return CustomJWTStrategy(
-        secret=SecretStr(
-            ACCESS_TOKEN_SECRET_KEY
-        ),  # Use SecretStr for enhanced security
-        lifetime_seconds=ACCESS_TOKEN_EXPIRE_SECONDS,
-        token_type="access",  # Specify it's for access tokens
-    )
+    return access_jwt_strategy
 
 
-# Create the JWT strategy for refresh tokens
 def get_refresh_jwt_strategy() -> CustomJWTStrategy:
-    return CustomJWTStrategy(
-        secret=SecretStr(
-            REFRESH_TOKEN_SECRET_KEY
-        ),  # Use SecretStr for enhanced security
-        lifetime_seconds=REFRESH_TOKEN_EXPIRE_SECONDS,
-        token_type="refresh",  # Specify it's for refresh tokens
-    )
+    return refresh_jwt_strategy
 
 
 # Create the authentication backend for access token
@@ -1,15 +1,45 @@
-from fastapi import Depends, HTTPException, Request
+from fastapi import HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 from typing import Optional
-from fastapi_users.jwt import decode_jwt, _get_secret_value
-from user.database_adapter import get_user_db
+from fastapi_auth.cache import ExpiringLRUCache
+from fastapi_auth.codec import HMACTokenCodec, InvalidTokenTypeError
+from fastapi_auth.keys import access_key_set
+from fastapi_auth.revocation import revocation_list
+from timing import span
 from decouple import config
 from pydantic import SecretStr
+import hashlib
 
-ACCESS_TOKEN_SECRET_KEY = SecretStr(config("ACCESS_TOKEN_SECRET_KEY"))
 REFRESH_TOKEN_SECRET_KEY = SecretStr(config("REFRESH_TOKEN_SECRET_KEY"))
+refresh_token_codec = HMACTokenCodec(REFRESH_TOKEN_SECRET_KEY, "HS256")
+
+# Maximum number of verified tokens kept per cache (0 disables caching)
+TOKEN_CACHE_MAX_SIZE = config("TOKEN_CACHE_MAX_SIZE", default=4096, cast=int)
+
+# Claims of tokens that already passed signature, audience, type and expiry checks.
+# Access and refresh tokens are signed with different secrets, so they get separate
+# caches: a hit must never stand in for a signature check against the other key.
+access_token_cache = ExpiringLRUCache(max_size=TOKEN_CACHE_MAX_SIZE)
+refresh_token_cache = ExpiringLRUCache(max_size=TOKEN_CACHE_MAX_SIZE)
+
+
+def token_cache_key(token: str) -> bytes:
+    # Key by digest so the cache never holds raw bearer tokens
+    return hashlib.sha256(token.encode()).digest()
+
+
+def request_claims(request: Request) -> dict:
+    """
+    Claims verified during this request, keyed by (token type, token).
+
+    Every guard on a route (route dependencies, parameters, nested dependencies)
+    resolves the same header, so only the first one verifies the token.
+    """
+    memo = getattr(request.state, "token_claims", None)
+    if memo is None:
+        memo = request.state.token_claims = {}
+    return memo
 
 
 class JWTBearer(HTTPBearer):
@@ -17,7 +47,9 @@ class JWTBearer(HTTPBearer):
         super(JWTBearer, self).__init__(auto_error=auto_error)
         self.token_type = token_type
 
-    async def __call__(self, request: Request, db: AsyncSession = Depends(get_user_db)):
+    # Verification is stateless: it only needs the signing secret, so the dependency
+    # must not pull in a database session that a route may never use
+    async def __call__(self, request: Request):
         credentials: HTTPAuthorizationCredentials = await super(
             JWTBearer, self
         ).__call__(request)
@@ -28,33 +60,50 @@ class JWTBearer(HTTPBearer):
                     status_code=403, detail="Invalid authentication scheme."
                 )
 
-            # Decode and verify the token
-            token_data = await self.decode_token(credentials.credentials)
-
-            # Check the token type
-            if token_data.get("token_type") != self.token_type:
-                raise HTTPException(status_code=400, detail="Invalid token type")
-
-            # Check if the token is expired
-            if self.token_expired(token_data):
-                raise HTTPException(
-                    status_code=401,
-                    detail=f"{self.token_type.capitalize()} token expired",
-                )
-
-            return token_data
+            # Decode and verify the token, once per request
+            memo = request_claims(request)
+            key = (self.token_type, credentials.credentials)
+            if key not in memo:
+                memo[key] = await self.verify_token(credentials.credentials)
+            return memo[key]
 
         raise HTTPException(status_code=403, detail="Authorization token not provided.")
 
+    async def verify_token(self, token: str) -> dict:
+        # Reuse the claims of a token we already verified, otherwise decode it
+        cache_key = token_cache_key(token)
+        token_data = access_token_cache.get(cache_key)
+        cached = token_data is not None
+        if not cached:
+            # Checks signature, expiry, audience and token type in one pass
+            with span("jwt_verify"):
+                token_data = await self.decode_token(token)
+        elif token_data.get("token_type") != self.token_type:
+            raise HTTPException(status_code=400, detail="Invalid token type")
+
+        # Revocation of the token and cutoffs of its user are checked even for
+        # cached claims; the common "not revoked" answer comes from an in-memory
+        # filter without any I/O
+        with span("revocation_check"):
+            revoked = await revocation_list.is_token_revoked(token_data)
+        if revoked:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        if not cached:
+            # Cached entries are dropped once the token's own `exp` passes
+            access_token_cache.set(cache_key, token_data, token_data["exp"])
+
+        return token_data
+
     async def decode_token(self, token: str):
 
         try:
-            return decode_jwt(
-                token,
-                secret=_get_secret_value(ACCESS_TOKEN_SECRET_KEY),
-                algorithms="HS256",
-                audience=["fastapi-users:auth"],
+            # The key (and its algorithm) is chosen by the token's `kid` header
+            return access_key_set.decode(
+                token, audience=["fastapi-users:auth"], token_type=self.token_type
             )
+        except InvalidTokenTypeError:
+            raise HTTPException(status_code=400, detail="Invalid token type")
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
@@ -71,7 +120,9 @@ class RefreshJWTBearer(HTTPBearer):
         super(RefreshJWTBearer, self).__init__(auto_error=auto_error)
         self.token_type = token_type
 
-    async def __call__(self, request: Request, db: AsyncSession = Depends(get_user_db)):
+    # Verification is stateless: it only needs the signing secret, so the dependency
+    # must not pull in a database session that a route may never use
+    async def __call__(self, request: Request):
         credentials: HTTPAuthorizationCredentials = await super(
             RefreshJWTBearer, self
         ).__call__(request)
@@ -82,33 +133,49 @@ class RefreshJWTBearer(HTTPBearer):
                     status_code=403, detail="Invalid authentication scheme."
                 )
 
-            # Decode and verify the token
-            token_data = await self.decode_token(credentials.credentials)
-
-            # Check the token type
-            if token_data.get("token_type") != self.token_type:
-                raise HTTPException(status_code=400, detail="Invalid token type")
-
-            # Check if the token is expired
-            if self.token_expired(token_data):
-                raise HTTPException(
-                    status_code=401,
-                    detail=f"{self.token_type.capitalize()} token expired",
-                )
-
-            return credentials.credentials
+            # Hand back the verified claims so the route never decodes the token again
+            memo = request_claims(request)
+            key = (self.token_type, credentials.credentials)
+            if key not in memo:
+                memo[key] = await self.verify_token(credentials.credentials)
+            return memo[key]
 
         raise HTTPException(status_code=403, detail="Authorization token not provided.")
 
+    async def verify_token(self, token: str) -> dict:
+        # Reuse the claims of a token we already verified, otherwise decode it
+        cache_key = token_cache_key(token)
+        token_data = refresh_token_cache.get(cache_key)
+        cached = token_data is not None
+        if not cached:
+            # Checks signature, expiry, audience and token type in one pass
+            with span("jwt_verify"):
+                token_data = await self.decode_token(token)
+        elif token_data.get("token_type") != self.token_type:
+            raise HTTPException(status_code=400, detail="Invalid token type")
+
+        # Revocation of the token and cutoffs of its user are checked even for
+        # cached claims; the common "not revoked" answer comes from an in-memory
+        # filter without any I/O
+        with span("revocation_check"):
+            revoked = await revocation_list.is_token_revoked(token_data)
+        if revoked:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        if not cached:
+            # Cached entries are dropped once the token's own `exp` passes
+            refresh_token_cache.set(cache_key, token_data, token_data["exp"])
+
+        return token_data
+
     async def decode_token(self, token: str):
 
         try:
-            return decode_jwt(
-                token,
-                secret=_get_secret_value(REFRESH_TOKEN_SECRET_KEY),
-                algorithms="HS256",
-                audience=["fastapi-users:auth"],
+            return refresh_token_codec.decode(
+                token, audience=["fastapi-users:auth"], token_type=self.token_type
             )
+        except InvalidTokenTypeError:
+            raise HTTPException(status_code=400, detail="Invalid token type")
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
@@ -118,3 +185,9 @@ class RefreshJWTBearer(HTTPBearer):
         now = datetime.now(timezone.utc)
         # Check if the token has expired
         return exp < now
+
+
+# Shared instances: FastAPI resolves a dependency once per request only when the
+# same callable is used, so routes should depend on these rather than new ones
+access_bearer = JWTBearer(token_type="access")
+refresh_bearer = RefreshJWTBearer(token_type="refresh")
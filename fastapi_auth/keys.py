@@ -0,0 +1,185 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+import jwt
+from decouple import Csv, config
+from fastapi_users.jwt import SecretType, _get_secret_value
+from jwt.algorithms import get_default_algorithms
+from pydantic import SecretStr
+
+from fastapi_auth.codec import HMAC_DIGESTS, HMACTokenCodec, InvalidTokenTypeError
+
+# Algorithm used to sign access tokens. HS256 keeps using ACCESS_TOKEN_SECRET_KEY;
+# EdDSA, ES256 and RS256 sign with a private key so other services can verify
+# tokens locally with the public keys served on /.well-known/jwks.json.
+ACCESS_TOKEN_ALGORITHM = config("ACCESS_TOKEN_ALGORITHM", default="HS256")
+ACCESS_TOKEN_SIGNING_KEY_ID = config("ACCESS_TOKEN_SIGNING_KEY_ID", default=None)
+ACCESS_TOKEN_PRIVATE_KEY_FILE = config("ACCESS_TOKEN_PRIVATE_KEY_FILE", default=None)
+# Extra public keys still accepted during a rotation, as "kid=path/to/key.pem"
+ACCESS_TOKEN_VERIFICATION_KEYS = config(
+    "ACCESS_TOKEN_VERIFICATION_KEYS", default="", cast=Csv()
+)
+JWKS_CACHE_MAX_AGE = config("JWKS_CACHE_MAX_AGE", default=300, cast=int)
+
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "ES256", "RS256")
+
+
+class VerificationKey:
+    def __init__(self, kid: Optional[str], algorithm: str, key: Any):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.key = key
+
+    def to_jwk(self) -> Dict[str, Any]:
+        jwk = json.loads(get_default_algorithms()[self.algorithm].to_jwk(self.key))
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeySet:
+    """
+    The key that signs new access tokens plus every key tokens are accepted from.
+
+    Tokens carry the signing key's `kid` in their header; verification looks the
+    key up by that `kid` and pins the algorithm to the one registered for it.
+    HMAC keys are verified by a precomputed codec picked by the exact header
+    segment, without parsing the header at all.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        signing_key: SecretType,
+        signing_key_id: Optional[str] = None,
+        verification_keys: Optional[List[VerificationKey]] = None,
+    ):
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.signing_key_id = signing_key_id
+
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            current = VerificationKey(
+                signing_key_id, algorithm, public_key(signing_key)
+            )
+        else:
+            current = VerificationKey(signing_key_id, algorithm, signing_key)
+
+        self.verification_keys: Dict[Optional[str], VerificationKey] = {
+            current.kid: current
+        }
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            # Shared secrets also accept tokens issued before a kid was configured
+            self.verification_keys.setdefault(None, current)
+        for key in verification_keys or []:
+            self.verification_keys.setdefault(key.kid, key)
+
+        self.codecs: Dict[bytes, HMACTokenCodec] = {}
+        for key in self.verification_keys.values():
+            if key.algorithm in HMAC_DIGESTS:
+                codec = HMACTokenCodec(key.key, key.algorithm, key.kid)
+                self.codecs[codec.header_segment] = codec
+
+        self._jwks_body: Optional[bytes] = None
+
+    @property
+    def public_key(self) -> Optional[Any]:
+        if self.algorithm in ASYMMETRIC_ALGORITHMS:
+            return self.verification_keys[self.signing_key_id].key
+        return None
+
+    def get_verification_key(self, token: str) -> VerificationKey:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.verification_keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+    def decode(
+        self, token: str, audience: List[str], token_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        codec = self.codecs.get(token.partition(".")[0].encode())
+        if codec is not None:
+            return codec.decode(token, audience, token_type)
+
+        key = self.get_verification_key(token)
+        payload = jwt.decode(
+            token,
+            _get_secret_value(key.key),
+            audience=audience,
+            algorithms=[key.algorithm],
+        )
+        if token_type is not None and payload.get("token_type") != token_type:
+            raise InvalidTokenTypeError("Invalid token type")
+        return payload
+
+    def jwks_body(self) -> bytes:
+        # Built once: the key set only changes on restart
+        if self._jwks_body is None:
+            keys = [
+                key.to_jwk()
+                for key in self.verification_keys.values()
+                if key.algorithm in ASYMMETRIC_ALGORITHMS
+            ]
+            self._jwks_body = json.dumps({"keys": keys}, separators=(",", ":")).encode()
+        return self._jwks_body
+
+    def jwks_etag(self) -> str:
+        return '"' + hashlib.sha256(self.jwks_body()).hexdigest()[:32] + '"'
+
+
+def public_key(key: Any) -> Any:
+    # Private key objects expose their public half; public keys are returned as is
+    return key.public_key() if hasattr(key, "public_key") else key
+
+
+def load_key(algorithm: str, path: str) -> Any:
+    # prepare_key parses the PEM and rejects keys that do not fit the algorithm
+    with open(path, "rb") as key_file:
+        return get_default_algorithms()[algorithm].prepare_key(key_file.read())
+
+
+def load_access_key_set() -> KeySet:
+    if ACCESS_TOKEN_ALGORITHM == "HS256":
+        return KeySet(
+            "HS256",
+            SecretStr(config("ACCESS_TOKEN_SECRET_KEY")),
+            ACCESS_TOKEN_SIGNING_KEY_ID,
+        )
+
+    if ACCESS_TOKEN_ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(
+            f"Unsupported ACCESS_TOKEN_ALGORITHM {ACCESS_TOKEN_ALGORITHM!r}. "
+            f"Use HS256 or one of {', '.join(ASYMMETRIC_ALGORITHMS)}."
+        )
+    if not ACCESS_TOKEN_PRIVATE_KEY_FILE or not ACCESS_TOKEN_SIGNING_KEY_ID:
+        raise ValueError(
+            "ACCESS_TOKEN_PRIVATE_KEY_FILE and ACCESS_TOKEN_SIGNING_KEY_ID are "
+            f"required for {ACCESS_TOKEN_ALGORITHM}."
+        )
+
+    verification_keys = []
+    for entry in ACCESS_TOKEN_VERIFICATION_KEYS:
+        kid, _, path = entry.partition("=")
+        if not path:
+            raise ValueError(
+                f"Invalid ACCESS_TOKEN_VERIFICATION_KEYS entry {entry!r}, "
+                "expected kid=path"
+            )
+        verification_keys.append(
+            VerificationKey(
+                kid.strip(),
+                ACCESS_TOKEN_ALGORITHM,
+                public_key(load_key(ACCESS_TOKEN_ALGORITHM, path.strip())),
+            )
+        )
+
+    return KeySet(
+        ACCESS_TOKEN_ALGORITHM,
+        load_key(ACCESS_TOKEN_ALGORITHM, ACCESS_TOKEN_PRIVATE_KEY_FILE),
+        ACCESS_TOKEN_SIGNING_KEY_ID,
+        verification_keys,
+    )
+
+
+access_key_set = load_access_key_set()
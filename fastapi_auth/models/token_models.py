@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, Column, String
+from database import Base
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_token"
+
+    # `jti` claim of the revoked access or refresh token
+    jti = Column(String(64), primary_key=True)
+    # Epoch seconds, same unit as the `exp` and `iat` claims
+    expires_at = Column(BigInteger, nullable=False, index=True)
+    revoked_at = Column(BigInteger, nullable=False, index=True)
@@ -0,0 +1,264 @@
+import hashlib
+import math
+import time
+from typing import List, Optional, Tuple
+
+from decouple import config
+from fastapi import HTTPException, Request, status
+
+from fastapi_auth.cache import ExpiringLRUCache
+from metrics import registry
+
+# Login attempts allowed per client IP and per email within the sliding window
+LOGIN_RATE_LIMIT_PER_IP = config("LOGIN_RATE_LIMIT_PER_IP", default=20, cast=int)
+LOGIN_RATE_LIMIT_PER_EMAIL = config("LOGIN_RATE_LIMIT_PER_EMAIL", default=5, cast=int)
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = config(
+    "LOGIN_RATE_LIMIT_WINDOW_SECONDS", default=60, cast=int
+)
+# In-process state: keys tracked in total, split over independent LRU shards
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+RATE_LIMIT_SHARDS = config("RATE_LIMIT_SHARDS", default=16, cast=int)
+# "memory" keeps counters per worker; "redis" shares them between workers
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="memory")
+RATE_LIMIT_REDIS_URL = config(
+    "RATE_LIMIT_REDIS_URL", default="redis://localhost:6379/0"
+)
+# Use the first X-Forwarded-For address; only safe behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED_FOR = config(
+    "RATE_LIMIT_TRUST_FORWARDED_FOR", default=False, cast=bool
+)
+
+LOGIN_RATE_LIMITED = registry.counter(
+    "login_rate_limited_total",
+    "Login attempts rejected with 429, by the limit that was hit.",
+    ("scope",),
+)
+LOGIN_ATTEMPTS = registry.counter(
+    "login_attempts_checked_total", "Login attempts checked by the rate limiter."
+)
+
+
+def sliding_window_retry_after(
+    previous: int, current: int, elapsed: float, window: float, limit: int
+) -> Optional[float]:
+    """
+    Seconds until another attempt is allowed, or None when one is allowed now.
+
+    Sliding window counter: the previous fixed window counts in proportion to
+    how much of it still overlaps the sliding window ending now.
+    """
+    weight = 1 - elapsed / window
+    if previous * weight + current < limit:
+        return None
+    if current < limit:
+        # The previous window's share has to decay until the estimate fits
+        return max(0.0, (1 - (limit - current) / previous) * window - elapsed)
+    # Wait for the next window, where this window's count becomes `previous`
+    return (window - elapsed) + (1 - limit / current) * window
+
+
+class MemoryRateLimitBackend:
+    """
+    Sliding window counters kept in this process, in sharded LRU caches.
+
+    Each key costs one small tuple and is dropped two windows after its last
+    hit. A shard that is full evicts its least recently used key, so a flood of
+    distinct IPs or emails is bounded in memory and only evicts keys that hash
+    to the same shard.
+    """
+
+    def __init__(
+        self, max_keys: int = RATE_LIMIT_MAX_KEYS, shards: int = RATE_LIMIT_SHARDS
+    ):
+        shards = max(1, shards)
+        self.shards: List[ExpiringLRUCache] = [
+            ExpiringLRUCache(max_size=max(1, max_keys // shards)) for _ in range(shards)
+        ]
+
+    def _shard(self, key: str) -> ExpiringLRUCache:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return self.shards[int.from_bytes(digest, "little") % len(self.shards)]
+
+    async def hit(self, key: str, limit: int, window: int) -> Optional[float]:
+        now = time.time()
+        window_index, elapsed = divmod(now, window)
+        shard = self._shard(key)
+
+        # State: (window index, count in the previous window, count in this one)
+        state: Optional[Tuple[float, int, int]] = shard.get(key, now)
+        if state is None:
+            previous, current = 0, 0
+        elif state[0] == window_index:
+            previous, current = state[1], state[2]
+        elif state[0] == window_index - 1:
+            previous, current = state[2], 0
+        else:
+            previous, current = 0, 0
+
+        retry_after = sliding_window_retry_after(
+            previous, current, elapsed, window, limit
+        )
+        if retry_after is None:
+            current += 1
+        shard.set(key, (window_index, previous, current), (window_index + 2) * window)
+        return retry_after
+
+    async def reset(self, key: str, window: int) -> None:
+        self._shard(key).pop(key)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "shards": len(self.shards),
+            "keys": sum(len(shard) for shard in self.shards),
+            "max_keys": sum(shard.max_size for shard in self.shards),
+            "evictions": sum(shard.evictions for shard in self.shards),
+        }
+
+
+# Counts the attempt before anything is decided, so concurrent attempts from any
+# number of workers each see a distinct count. Returns the previous window's
+# count and this window's count including the attempt.
+_REDIS_HIT_SCRIPT = """
+local current = redis.call("INCR", KEYS[1])
+if current == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+return {tonumber(redis.call("GET", KEYS[2]) or "0"), current}
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    The same sliding window counters in Redis, shared by every worker.
+
+    Needs the optional `redis` package. Each window is one INCR'd key that
+    expires on its own, so Redis memory is bounded by the active keys.
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "RATE_LIMIT_BACKEND=redis requires the redis package "
+                "(pip install redis)"
+            )
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._hit_script = self.client.register_script(_REDIS_HIT_SCRIPT)
+
+    async def hit(self, key: str, limit: int, window: int) -> Optional[float]:
+        now = time.time()
+        window_index, elapsed = divmod(now, window)
+        current_key = f"{self.prefix}{key}:{int(window_index)}"
+        previous_key = f"{self.prefix}{key}:{int(window_index) - 1}"
+
+        previous, current = await self._hit_script(
+            keys=[current_key, previous_key], args=[2 * window]
+        )
+        # Decide on the count before this attempt, as the memory backend does
+        retry_after = sliding_window_retry_after(
+            int(previous), int(current) - 1, elapsed, window, limit
+        )
+        if retry_after is not None:
+            # Rejected attempts do not count. Until this lands, concurrent
+            # attempts see one more than was allowed, which only errs towards 429.
+            await self.client.decr(current_key)
+        return retry_after
+
+    async def reset(self, key: str, window: int) -> None:
+        window_index = int(time.time() // window)
+        await self.client.delete(
+            f"{self.prefix}{key}:{window_index}",
+            f"{self.prefix}{key}:{window_index - 1}",
+        )
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class LoginRateLimiter:
+    """
+    Per-IP and per-email limits checked before a login reaches the database
+    or bcrypt. A successful login clears its email's counter.
+    """
+
+    def __init__(
+        self,
+        backend,
+        per_ip: int = LOGIN_RATE_LIMIT_PER_IP,
+        per_email: int = LOGIN_RATE_LIMIT_PER_EMAIL,
+        window: int = LOGIN_RATE_LIMIT_WINDOW_SECONDS,
+    ):
+        self.backend = backend
+        self.per_ip = per_ip
+        self.per_email = per_email
+        self.window = window
+
+    @staticmethod
+    def client_ip(request: Request) -> str:
+        if RATE_LIMIT_TRUST_FORWARDED_FOR:
+            forwarded_for = request.headers.get("x-forwarded-for")
+            if forwarded_for:
+                return forwarded_for.split(",", 1)[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return "login:email:" + email.strip().lower()
+
+    async def check(self, request: Request, email: str) -> None:
+        LOGIN_ATTEMPTS.inc()
+        limits = (
+            ("ip", "login:ip:" + self.client_ip(request), self.per_ip),
+            ("email", self._email_key(email), self.per_email),
+        )
+        for scope, key, limit in limits:
+            if limit <= 0:
+                continue
+            retry_after = await self.backend.hit(key, limit, self.window)
+            if retry_after is not None:
+                LOGIN_RATE_LIMITED.inc(scope)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many login attempts",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+    async def reset_email(self, email: str) -> None:
+        await self.backend.reset(self._email_key(email), self.window)
+
+    def stats(self) -> dict:
+        return {
+            "per_ip": self.per_ip,
+            "per_email": self.per_email,
+            "window_seconds": self.window,
+            **self.backend.stats(),
+        }
+
+
+def create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend()
+    if RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(
+            f"Unsupported RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r}. "
+            "Use memory or redis."
+        )
+    return MemoryRateLimitBackend()
+
+
+login_rate_limiter = LoginRateLimiter(create_backend())
+
+registry.callback(
+    "login_rate_limit_keys",
+    "IP and email counters held by the in-process login rate limiter.",
+    lambda: login_rate_limiter.stats().get("keys", 0),
+)
+registry.callback(
+    "login_rate_limit_evictions_total",
+    "Rate limit counters evicted because their shard was full.",
+    lambda: login_rate_limiter.stats().get("evictions", 0),
+    type="counter",
+)
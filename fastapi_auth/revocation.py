@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import math
+import time
+from typing import Any, Dict, Optional
+
+from decouple import config
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from fastapi_auth.cache import ExpiringLRUCache
+from fastapi_auth.models.token_models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Expected number of live revocations and the accepted false positive rate. A
+# false positive only costs one primary-key SELECT, never a wrongly rejected token.
+REVOCATION_FILTER_CAPACITY = config(
+    "REVOCATION_FILTER_CAPACITY", default=100000, cast=int
+)
+REVOCATION_FILTER_ERROR_RATE = config(
+    "REVOCATION_FILTER_ERROR_RATE", default=0.001, cast=float
+)
+# How often revocations made by other workers are pulled in, and how often the
+# filter is rebuilt from scratch after pruning expired rows
+REVOCATION_SYNC_SECONDS = config("REVOCATION_SYNC_SECONDS", default=5, cast=int)
+REVOCATION_REBUILD_SECONDS = config(
+    "REVOCATION_REBUILD_SECONDS", default=3600, cast=int
+)
+
+# User cutoffs must outlive every token issued before them
+TOKEN_MAX_LIFETIME_SECONDS = max(
+    config("ACCESS_TOKEN_EXPIRE_SECONDS", cast=int),
+    config("REFRESH_TOKEN_EXPIRE_SECONDS", cast=int),
+)
+
+# Rows committed slightly out of order (or by a host with a skewed clock) must
+# still be picked up by the next incremental sync
+SYNC_OVERLAP_SECONDS = 30
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Uses double hashing of one BLAKE2b digest to derive the bit positions, so
+    a lookup costs a single hash regardless of the number of hash functions.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        )
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+def user_key(user_id: Any) -> str:
+    # Stored alongside token ids; `jti`s are hex, so the prefix cannot collide
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    """
+    Revoked token ids, stored in the `revoked_token` table and mirrored in memory.
+
+    Besides single tokens, a user can be cut off: every token issued to them up
+    to that second is rejected. The in-memory Bloom filter answers the common
+    "not revoked" case without any I/O. Only a filter hit is confirmed against
+    the table, and confirmed revocations are remembered until the token would
+    have expired anyway.
+    """
+
+    def __init__(
+        self,
+        capacity: int = REVOCATION_FILTER_CAPACITY,
+        error_rate: float = REVOCATION_FILTER_ERROR_RATE,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        # key -> revoked_at
+        self._confirmed = ExpiringLRUCache(max_size=capacity)
+        self._synced_at: Optional[int] = None
+
+        self.filter_hits = 0
+        self.false_positives = 0
+
+    async def _revoked_at(self, key: str) -> Optional[int]:
+        # Checked first so a token revoked here while `rebuild` swaps the filter
+        # is still caught
+        revoked_at = self._confirmed.get(key)
+        if revoked_at is not None:
+            return revoked_at
+
+        if key not in self._filter:
+            return None
+
+        self.filter_hits += 1
+        async with AsyncSessionLocal() as session:
+            revoked = await session.get(RevokedToken, key)
+
+        if revoked is None:
+            self.false_positives += 1
+            return None
+
+        self._confirmed.set(key, revoked.revoked_at, revoked.expires_at)
+        return revoked.revoked_at
+
+    async def is_revoked(self, jti: str) -> bool:
+        return await self._revoked_at(jti) is not None
+
+    async def is_token_revoked(self, claims: Dict[str, Any]) -> bool:
+        jti = claims.get("jti")
+        if jti is not None and await self.is_revoked(jti):
+            return True
+
+        sub = claims.get("sub")
+        if sub is None:
+            return False
+        cutoff = await self._revoked_at(user_key(sub))
+        if cutoff is None:
+            return False
+        # Tokens without `iat` predate it, so they predate any cutoff as well
+        issued_at = claims.get("iat")
+        return issued_at is None or issued_at <= cutoff
+
+    async def revoke(self, session: AsyncSession, jti: str, expires_at: int) -> None:
+        session.add(
+            RevokedToken(jti=jti, expires_at=expires_at, revoked_at=int(time.time()))
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Already revoked
+            await session.rollback()
+
+        self.remember(jti, int(time.time()), expires_at)
+
+    async def stage_user_cutoff(
+        self, session: AsyncSession, user_id: Any
+    ) -> RevokedToken:
+        """
+        Adds a cutoff for every token issued to the user so far to `session`,
+        without committing. Pass the returned row to `remember` once committed.
+        """
+        revoked_at = int(time.time())
+        return await session.merge(
+            RevokedToken(
+                jti=user_key(user_id),
+                revoked_at=revoked_at,
+                expires_at=revoked_at + TOKEN_MAX_LIFETIME_SECONDS,
+            )
+        )
+
+    def remember(self, key: str, revoked_at: int, expires_at: int) -> None:
+        # Takes effect in this process at once; other workers pick it up on sync
+        self._filter.add(key)
+        self._confirmed.set(key, revoked_at, expires_at)
+
+    async def sync(self) -> None:
+        # Add revocations recorded since the last sync, by this or any other worker
+        started_at = int(time.time())
+        statement = select(RevokedToken.jti)
+        if self._synced_at is not None:
+            statement = statement.where(
+                RevokedToken.revoked_at >= self._synced_at - SYNC_OVERLAP_SECONDS
+            )
+
+        async with AsyncSessionLocal() as session:
+            jtis = (await session.execute(statement)).scalars().all()
+
+        for jti in jtis:
+            if jti not in self._filter:
+                self._filter.add(jti)
+        self._synced_at = started_at
+
+    async def rebuild(self) -> None:
+        # Bloom filters cannot forget, so expired entries are dropped by pruning
+        # the table and building a fresh filter sized for what is left
+        started_at = int(time.time())
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(RevokedToken).where(RevokedToken.expires_at < started_at)
+            )
+            await session.commit()
+            jtis = (await session.execute(select(RevokedToken.jti))).scalars().all()
+
+        new_filter = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            new_filter.add(jti)
+
+        self._filter = new_filter
+        self._synced_at = started_at
+        logger.debug("Revocation filter rebuilt with %d entries.", len(jtis))
+
+    def stats(self) -> dict:
+        return {
+            "filter_entries": self._filter.count,
+            "filter_bits": self._filter.size,
+            "filter_hashes": self._filter.hash_count,
+            "filter_hits": self.filter_hits,
+            "false_positives": self.false_positives,
+            "confirmed_cached": len(self._confirmed),
+        }
+
+
+revocation_list = RevocationList()
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_auth.config import (
     refresh_auth_backend,
     access_auth_backend,
-    get_refresh_jwt_strategy,
+    get_access_jwt_strategy,
 )
-from user.user_manager import get_user_manager, UserManager
-from fastapi_auth.schemas.jwt_auth_schema import TokenResponse, AccessTokenResponse
-from fastapi_auth.custom_dependency import JWTBearer, RefreshJWTBearer
+from user.user_manager import get_read_user_manager, UserManager
+from user.database_adapter import get_read_user_db, UserDatabase
+from fastapi_auth.schemas.jwt_auth_schema import (
+    TokenResponse,
+    AccessTokenResponse,
+    VerifyBatchRequest,
+    VerifyBatchResult,
+    VerifyBatchResponse,
+    RevokeRequest,
+)
+from fastapi_auth.custom_dependency import access_bearer, refresh_bearer
+from fastapi_auth.revocation import revocation_list
+from fastapi_auth.rate_limit import login_rate_limiter
 from fastapi_auth.utils import get_token_user
-
+from fastapi_auth.auth import token_claims
+from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from timing import span
+import uuid
 
 custom_jwt_auth_router = APIRouter()
 
@@ -24,18 +39,29 @@ custom_jwt_auth_router = APIRouter()
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Invalid credentials or inactive user.",
         },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "description": "Too many attempts from this IP or for this email, "
+            "see Retry-After.",
+        },
     },
 )
 async def login(
+    request: Request,
     credentials: OAuth2PasswordRequestForm = Depends(),
-    user_manager_instance: UserManager = Depends(get_user_manager),
+    user_manager_instance: UserManager = Depends(get_read_user_manager),
 ):
+    # Throttle before the email lookup and the bcrypt verify
+    with span("rate_limit"):
+        await login_rate_limiter.check(request, credentials.username)
+
     # Use the 'username' field, which contains the email in this case
     user = await user_manager_instance.authenticate(credentials)
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    await login_rate_limiter.reset_email(credentials.username)
+
     # Create an access token and refresh token
     access_token = await access_auth_backend.get_strategy().write_token(user)
     refresh_token = await refresh_auth_backend.get_strategy().write_token(user)
@@ -76,22 +102,16 @@ async def login(
     },
 )
 async def refresh_access_token(
-    refresh_token: dict = Depends(RefreshJWTBearer(token_type="refresh")),
-    user_manager_instance: UserManager = Depends(get_user_manager),
+    refresh_token: dict = Depends(refresh_bearer),
+    user_manager_instance: UserManager = Depends(get_read_user_manager),
 ):
 
-    # Verify the refresh token
-    refresh_strategy = get_refresh_jwt_strategy()
-    try:
-        # Use the strategy to read and validate the refresh token
-        user = await refresh_strategy.read_token(refresh_token, user_manager_instance)
+    # The dependency already verified the refresh token, load the user from its claims
+    user = await get_token_user(refresh_token, user_manager_instance)
 
-        # Issue a new access token
-        access_token = await access_auth_backend.get_strategy().write_token(user)
-        return {"access_token": access_token}
-
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid refresh token: {str(e)}")
+    # Issue a new access token
+    access_token = await get_access_jwt_strategy().write_token(user)
+    return {"access_token": access_token}
 
 
 # Define the route that uses this dependency for token verification
@@ -128,12 +148,99 @@ async def refresh_access_token(
         },
     },
 )
-async def verify_access_token(
-    payload: dict = Depends(JWTBearer(token_type="access")),
-    user_manager_instance: UserManager = Depends(get_user_manager),
-):
-
-    user = await get_token_user(payload, user_manager_instance)
+async def verify_access_token(payload: dict = Depends(token_claims)):
+    # Fresh embedded claims answer without a user lookup; stale or claim-less
+    # tokens are still checked against the user
 
     # Return success if everything is valid
     return {"message": "Token is valid"}
+
+
+@custom_jwt_auth_router.post(
+    "/jwt/verify-batch",
+    response_model=VerifyBatchResponse,
+    description="Verify several access tokens at once. Each token gets its own result, "
+    "in request order; an invalid token does not fail the batch.",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Per-token validity and claims",
+            "model": VerifyBatchResponse,
+        },
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Validation error - Check request format / too many tokens.",
+        },
+    },
+)
+async def verify_access_tokens_batch(
+    batch: VerifyBatchRequest,
+    user_db: UserDatabase = Depends(get_read_user_db),
+):
+    results = []
+    user_ids = []
+    for token in batch.tokens:
+        try:
+            claims = await access_bearer.verify_token(token)
+            user_id = uuid.UUID(claims["sub"])
+        except HTTPException as e:
+            results.append(VerifyBatchResult(valid=False, error=e.detail))
+            user_ids.append(None)
+            continue
+        except (KeyError, TypeError, ValueError):
+            results.append(VerifyBatchResult(valid=False, error="Invalid token"))
+            user_ids.append(None)
+            continue
+
+        results.append(VerifyBatchResult(valid=True, claims=claims))
+        user_ids.append(user_id)
+
+    # Load every referenced user with a single query instead of one per token
+    users = await user_db.get_many({user_id for user_id in user_ids if user_id})
+    for result, user_id in zip(results, user_ids):
+        if user_id is not None and user_id not in users:
+            result.valid = False
+            result.claims = None
+            result.error = "Invalid token"
+
+    return VerifyBatchResponse(results=results)
+
+
+@custom_jwt_auth_router.post(
+    "/jwt/revoke",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Revoke the access token in the Authorization header and, optionally, "
+    "a refresh token of the same user",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Invalid token type / Token cannot be revoked.",
+        },
+        status.HTTP_401_UNAUTHORIZED: {
+            "description": "Invalid token.",
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Invalid authentication scheme / Authorization token not provided"
+            " / Refresh token belongs to another user",
+        },
+    },
+)
+async def revoke_tokens(
+    revoke: Optional[RevokeRequest] = None,
+    payload: dict = Depends(access_bearer),
+    db: AsyncSession = Depends(get_db),
+):
+    tokens = [payload]
+    if revoke is not None and revoke.refresh_token:
+        refresh_payload = await refresh_bearer.verify_token(revoke.refresh_token)
+        if refresh_payload.get("sub") != payload.get("sub"):
+            raise HTTPException(
+                status_code=403, detail="Refresh token belongs to another user"
+            )
+        tokens.append(refresh_payload)
+
+    # Tokens issued before `jti` was added cannot be told apart, they simply expire
+    if any("jti" not in token for token in tokens):
+        raise HTTPException(status_code=400, detail="Token cannot be revoked")
+
+    for token in tokens:
+        await revocation_list.revoke(db, token["jti"], token["exp"])
+
+    return None
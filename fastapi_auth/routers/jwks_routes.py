@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request, Response
+from fastapi_auth.keys import JWKS_CACHE_MAX_AGE, access_key_set
+
+jwks_router = APIRouter()
+
+
+@jwks_router.get(
+    "/.well-known/jwks.json",
+    description="Public keys that verify access tokens, selected by the token's kid header",
+)
+async def get_jwks(request: Request):
+    headers = {
+        "Cache-Control": f"public, max-age={JWKS_CACHE_MAX_AGE}",
+        "ETag": access_key_set.jwks_etag(),
+    }
+
+    # Let caches and verifiers revalidate without downloading the keys again
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=access_key_set.jwks_body(),
+        media_type="application/jwk-set+json",
+        headers=headers,
+    )
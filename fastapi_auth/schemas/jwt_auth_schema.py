@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from decouple import config
+
+# Maximum number of tokens accepted by one /jwt/verify-batch request
+VERIFY_BATCH_MAX_TOKENS = config("VERIFY_BATCH_MAX_TOKENS", default=100, cast=int)
 
 
 # Pydantic models for request and response bodies
@@ -13,5 +18,24 @@ class AccessTokenResponse(BaseModel):
     access_token: str
 
 
+class RevokeRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
 class ErrorResponse(BaseModel):
     detail: str
+
+
+class VerifyBatchRequest(BaseModel):
+    # Checked during validation, so an oversized batch never reaches the route
+    tokens: List[str] = Field(..., max_length=VERIFY_BATCH_MAX_TOKENS)
+
+
+class VerifyBatchResult(BaseModel):
+    valid: bool
+    claims: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class VerifyBatchResponse(BaseModel):
+    results: List[VerifyBatchResult]
@@ -1,10 +1,17 @@
-from fastapi_users.jwt import generate_jwt
+from fastapi_users.jwt import _get_secret_value
 from fastapi_users.authentication.strategy.jwt import JWTStrategy
 from fastapi_users import models
 from typing import Optional, List
 from fastapi_users.jwt import SecretType
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
+from fastapi_auth.claims import ACCESS_TOKEN_EMBED_CLAIMS, embedded_claims
+from fastapi_auth.codec import HMAC_DIGESTS, HMACTokenCodec
+from timing import span
 from user.user_manager import UserManager
+from datetime import datetime, timedelta, timezone
+import jwt
+import time
+import uuid
 
 
 class CustomJWTStrategy(JWTStrategy):
@@ -16,11 +23,20 @@ class CustomJWTStrategy(JWTStrategy):
         algorithm: str = "HS256",
         public_key: Optional[SecretType] = None,
         token_type: str = "access",
+        key_id: Optional[str] = None,
     ):
         super().__init__(
             secret, lifetime_seconds, token_audience, algorithm, public_key
         )
         self.token_type = token_type
+        # Written to the `kid` header so verifiers can pick the matching key
+        self.key_id = key_id
+        # HMAC tokens are signed with precomputed key state and header
+        self.codec = (
+            HMACTokenCodec(secret, algorithm, key_id)
+            if algorithm in HMAC_DIGESTS
+            else None
+        )
 
         # Ensure token_type is valid
         if self.token_type not in ["access", "refresh"]:
@@ -32,24 +48,56 @@ class CustomJWTStrategy(JWTStrategy):
             "sub": str(user.id),  # User ID
             "aud": self.token_audience,  # Audience
             "token_type": self.token_type,  # Use token_type from the instance
+            "jti": uuid.uuid4().hex,  # Unique token id, used to revoke the token
+            "iat": int(time.time()),  # Compared with cutoffs of the user
         }
+        if self.token_type == "access" and ACCESS_TOKEN_EMBED_CLAIMS:
+            # Flags and their version, so routes can authorize without a lookup
+            data.update(embedded_claims(user))
 
-        # Generate the JWT with the custom payload
-        return generate_jwt(
-            data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm
-        )
+        with span("jwt_sign"):
+            if self.codec is not None:
+                # Same token generate_jwt would produce: `exp` in whole seconds, last
+                if self.lifetime_seconds:
+                    data["exp"] = int(time.time() + self.lifetime_seconds)
+                return self.codec.encode(data)
 
+            # Signed by pyjwt otherwise, mirroring generate_jwt with a `kid` header
+            if self.lifetime_seconds:
+                data["exp"] = datetime.now(timezone.utc) + timedelta(
+                    seconds=self.lifetime_seconds
+                )
+            return jwt.encode(
+                data,
+                _get_secret_value(self.encode_key),
+                algorithm=self.algorithm,
+                headers=None if self.key_id is None else {"kid": self.key_id},
+            )
 
-async def get_token_user(payload: dict, user_manager_instance: UserManager):
+
+async def get_token_user(
+    payload: dict, user_manager_instance: UserManager, request: Optional[Request] = None
+):
     # Get user from the token payload
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Guards and the route itself share the user loaded for this request
+    if request is not None:
+        memo = getattr(request.state, "token_user", None)
+        if memo is not None and memo[0] == user_id:
+            return memo[1]
+
     # Fetch the user from the database using the user manager
     try:
-        user = await user_manager_instance.get(user_id)
+        with span("user_lookup"):
+            user = await user_manager_instance.get_cached(
+                user_manager_instance.parse_id(user_id)
+            )
     except:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    if request is not None:
+        request.state.token_user = (user_id, user)
     return user
@@ -0,0 +1,219 @@
+import atexit
+import datetime
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
+
+from decouple import Csv, config
+
+from metrics import registry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+# Root level, plus per-logger overrides as comma separated `logger=LEVEL` pairs,
+# e.g. "sqlalchemy.engine=INFO,uvicorn.access=WARNING"
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+LOG_LEVELS = config("LOG_LEVELS", default="", cast=Csv())
+# SQLAlchemy logs every statement as soon as its logger is enabled for INFO
+DEFAULT_LOG_LEVELS = {"sqlalchemy.engine": "WARNING"}
+# Fraction of records below WARNING kept per logger, as `logger=rate` pairs.
+# SQL statements at INFO are useful for a sample of traffic, never for all of it.
+LOG_SAMPLE_RATES = config(
+    "LOG_SAMPLE_RATES", default="sqlalchemy.engine=0.01", cast=Csv()
+)
+# "json" for log shippers, "text" for a terminal
+LOG_FORMAT = config("LOG_FORMAT", default="json")
+# Records waiting for the writer thread; beyond this they are dropped rather than
+# blocking the event loop
+LOG_QUEUE_SIZE = config("LOG_QUEUE_SIZE", default=10000, cast=int)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+# Loggers uvicorn gives their own synchronous handlers; they are routed through
+# the queue like everything else
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _parse_pairs(pairs) -> Dict[str, str]:
+    return dict(pair.split("=", 1) for pair in pairs if "=" in pair)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records of chosen loggers (and their children).
+
+    Warnings and errors always pass. The most specific configured logger name
+    decides the rate, so "sqlalchemy.engine" can be sampled while
+    "sqlalchemy.pool" is not.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without ever waiting for it.
+
+    Only the message is rendered here (so mutable arguments are captured);
+    formatting and I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingSetup:
+    """Installs the queue handler on the root logger and owns the writer thread."""
+
+    def __init__(self):
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.sampler: Optional[SamplingFilter] = None
+        self.listener: Optional[QueueListener] = None
+
+    def configure(
+        self,
+        level: str = LOG_LEVEL,
+        levels: Dict[str, str] = None,
+        sample_rates: Dict[str, float] = None,
+        format: str = LOG_FORMAT,
+        queue_size: int = LOG_QUEUE_SIZE,
+        stream: TextIO = None,
+    ) -> None:
+        self.shutdown()
+        if levels is None:
+            levels = {**DEFAULT_LOG_LEVELS, **_parse_pairs(LOG_LEVELS)}
+        if sample_rates is None:
+            sample_rates = {
+                name: float(rate)
+                for name, rate in _parse_pairs(LOG_SAMPLE_RATES).items()
+            }
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(
+            JSONFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+
+        self.sampler = SamplingFilter(sample_rates)
+        self.handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        self.handler.addFilter(self.sampler)
+        self.listener = QueueListener(self.handler.queue, output)
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(level.upper())
+        for name in UVICORN_LOGGERS:
+            logging.getLogger(name).handlers.clear()
+            logging.getLogger(name).propagate = True
+        for name, logger_level in levels.items():
+            logging.getLogger(name).setLevel(logger_level.upper())
+
+        self.listener.start()
+
+    def shutdown(self) -> None:
+        # Flushes whatever is still queued
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.handler is not None:
+            logging.getLogger().removeHandler(self.handler)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0,
+            "sampled_out": self.sampler.sampled_out if self.sampler else 0,
+        }
+
+
+logging_setup = LoggingSetup()
+atexit.register(logging_setup.shutdown)
+
+registry.callback(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+    lambda: logging_setup.stats()["dropped"],
+    type="counter",
+)
+registry.callback(
+    "log_records_sampled_out_total",
+    "Log records skipped by per-logger sampling.",
+    lambda: logging_setup.stats()["sampled_out"],
+    type="counter",
+)
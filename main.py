@@ -1,21 +1,32 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import AsyncSessionLocal, engine
-from sqlalchemy import text
+from fastapi.responses import JSONResponse, PlainTextResponse
+from database import engine
+from db_health import check_all, pool_health, replica_health, DATABASE_PING
 from contextlib import asynccontextmanager
 from fastapi_utils.tasks import repeat_every
 from fastapi_auth.auth import fastapi_users
 from fastapi_auth.routers.auth_routes import custom_jwt_auth_router
+from fastapi_auth.routers.jwks_routes import jwks_router
+from fastapi_auth.revocation import (
+    revocation_list,
+    REVOCATION_SYNC_SECONDS,
+    REVOCATION_REBUILD_SECONDS,
+)
 from user.routers.user_routes import user_routers
-from decouple import config
 from user.schemas.user_schemas import UserCreate, UserDB
+from user.password import configure_rounds, hashing_executor, password_helper
+from user.database_adapter import user_cache
+from user.outbox import OUTBOX_WORKER_ENABLED, outbox_worker
+from fastapi_auth.custom_dependency import access_token_cache, refresh_token_cache
+from metrics import registry, RequestMetricsMiddleware
+from timing import ServerTimingMiddleware
+from logging_config import logging_setup
 
-DATABASE_PING = config("DATABASE_PING")
 import logging
 
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records are written as JSON by a background thread
+logging_setup.configure()
 logger = logging.getLogger(__name__)
 
 
@@ -48,26 +59,61 @@ app.add_middleware(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup task: keep database connection alive
-    logger.info("Starting up and initiating keep-alive task.")
+    # Startup task: watch database health
+    logger.info("Starting up and initiating database health checks.")
+
+    # Pings only when no traffic proved the database is up since the last check
+    @repeat_every(seconds=DATABASE_PING)
+    async def check_db_health():
+        await check_all()
+
+    # Load the token revocation filter before serving, then keep it in sync with
+    # revocations made by other workers and prune it of expired entries
+    try:
+        await revocation_list.rebuild()
+    except Exception as e:
+        logger.error(f"Error loading revoked tokens: {e}")
+
+    @repeat_every(seconds=REVOCATION_SYNC_SECONDS, wait_first=REVOCATION_SYNC_SECONDS)
+    async def sync_revoked_tokens():
+        try:
+            await revocation_list.sync()
+        except Exception as e:
+            logger.error(f"Error syncing revoked tokens: {e}")
 
-    # Define the keep-alive task
-    @repeat_every(seconds=int(DATABASE_PING))  # Runs every 5 seconds
-    async def keep_db_alive():
+    @repeat_every(
+        seconds=REVOCATION_REBUILD_SECONDS, wait_first=REVOCATION_REBUILD_SECONDS
+    )
+    async def rebuild_revoked_tokens():
         try:
-            async with AsyncSessionLocal() as session:
-                await session.execute(text("SELECT 1"))
-                logger.info("Keep-alive query executed successfully.")
+            await revocation_list.rebuild()
         except Exception as e:
-            logger.error(f"Error executing keep-alive query: {e}")
+            logger.error(f"Error rebuilding revoked tokens filter: {e}")
+
+    # The pinned bcrypt cost, or one calibrated for this machine when asked to.
+    # Stored hashes are rehashed on their next successful login: to any other
+    # pinned cost, but only upwards to a calibrated one.
+    try:
+        rounds = await configure_rounds()
+        logger.info("Hashing passwords with bcrypt cost %s.", rounds)
+    except Exception as e:
+        logger.error(f"Error calibrating password hashing: {e}")
 
     # Startup tasks before yielding control to the app
-    await keep_db_alive()
+    await check_db_health()
+    await sync_revoked_tokens()
+    await rebuild_revoked_tokens()
+
+    # Dispatch the side effects of user lifecycle hooks in the background
+    if OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
 
     yield
 
     # Shutdown tasks (if any)
     logger.info("Shutting down.")
+    await outbox_worker.stop()
+    hashing_executor.shutdown()
     await engine.dispose()
     # Cleanup tasks go here if necessary
 
@@ -76,6 +122,13 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 
 
+# Count requests per route template for /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
+# Time the phases of sampled requests: Server-Timing header and per-phase histograms
+app.add_middleware(ServerTimingMiddleware)
+
+
 app.include_router(
     fastapi_users.get_register_router(UserDB, UserCreate),
     prefix="/auth",
@@ -84,6 +137,8 @@ app.include_router(
 
 app.include_router(custom_jwt_auth_router, prefix="/auth", tags=["auth"])
 
+app.include_router(jwks_router, tags=["auth"])
+
 app.include_router(user_routers, prefix="/user", tags=["user"])
 
 
@@ -109,6 +164,81 @@ async def get_routes():
     ]
 
 
+@app.get("/debug/hashing", tags=["debug"])
+async def get_hashing_stats():
+    return {**hashing_executor.stats(), **password_helper.stats()}
+
+
+@app.get("/debug/revocation", tags=["debug"])
+async def get_revocation_stats():
+    return revocation_list.stats()
+
+
+registry.callback(
+    "cache_requests_total",
+    "Lookups in the in-process caches by cache and result.",
+    lambda: [
+        ((name, result), cache.stats()[result])
+        for name, cache in (
+            ("access_token", access_token_cache),
+            ("refresh_token", refresh_token_cache),
+            ("user", user_cache),
+        )
+        for result in ("hits", "misses")
+    ],
+    labels=("cache", "result"),
+    type="counter",
+)
+registry.callback(
+    "password_hash_operations_total",
+    "Password hash operations by outcome.",
+    lambda: [
+        ((outcome,), hashing_executor.stats()[outcome])
+        for outcome in ("completed", "rejected", "failed")
+    ],
+    labels=("outcome",),
+    type="counter",
+)
+registry.callback(
+    "password_hash_queued",
+    "Password hash operations waiting for a worker.",
+    lambda: hashing_executor.queued,
+)
+registry.callback(
+    "password_hash_rounds",
+    "bcrypt cost new password hashes are made with.",
+    lambda: password_helper.rounds,
+)
+registry.callback(
+    "password_rehashes_total",
+    "Stored password hashes replaced on login because their cost was not current.",
+    lambda: password_helper.rehashes,
+    type="counter",
+)
+registry.callback(
+    "revocation_filter_entries",
+    "Revoked token ids held in the in-memory filter.",
+    lambda: revocation_list.stats()["filter_entries"],
+)
+
+
+@app.get("/metrics", tags=["debug"], response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/health/ready", tags=["health"])
+async def readiness():
+    # Only the primary decides readiness, reads fall back to it without replicas
+    state = pool_health.state()
+    state["replicas"] = [monitor.state() for monitor in replica_health]
+    if not state["healthy"]:
+        return JSONResponse(status_code=503, content={"status": "unavailable", **state})
+    return {"status": "ready", **state}
+
+
 # route for root / homepage
 @app.get("/")
 async def read_root():
@@ -0,0 +1,238 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond statements to pool timeouts
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str]) -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Only the matching bucket is incremented; cumulative counts are built on render
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labels + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose value is read from `callback` at scrape time, so
+    state kept elsewhere (pool size, cache counters) costs nothing per request.
+    The callback returns a number, or a list of (label values, number) pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable,
+        labels: Sequence[str] = (),
+        type: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labels = tuple(labels)
+        self.type = type
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if not isinstance(value, list):
+            value = [((), value)]
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(sample)}"
+            for key, sample in value
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable,
+        labels: Sequence[str] = (),
+        type: str = "gauge",
+    ):
+        return self.register(
+            CallbackMetric(name, documentation, callback, labels, type)
+        )
+
+    def render(self) -> str:
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total",
+    "HTTP requests by route template, method and status code.",
+    ("route", "method", "status"),
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to produce the full HTTP response, by route template.",
+    ("route", "method"),
+)
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+
+    # Newer FastAPI versions keep included routers nested instead of copying their
+    # routes with the prefix applied, and record the include prefix in the scope
+    included_router = scope.get("fastapi", {}).get("included_router")
+    include_context = getattr(included_router, "include_context", None)
+    return getattr(include_context, "prefix", "") + route.path
+
+
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware counting requests per matched route template.
+
+    The route is read from the scope after the app ran, when FastAPI has put the
+    matched APIRoute there, so path parameters do not explode the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(path, method, str(status_code))
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started_at, path, method
+            )
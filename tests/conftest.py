@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+# Settings the application modules read at import time, so they are set before
+# anything is imported. Tests always run against a throwaway SQLite file.
+_workdir = tempfile.mkdtemp(prefix="auth-tests-")
+os.environ.update(
+    {
+        "ACCESS_TOKEN_SECRET_KEY": "test-access-secret-key-0123456789abcdef",
+        "REFRESH_TOKEN_SECRET_KEY": "test-refresh-secret-key-0123456789abcdef",
+        "ACCESS_TOKEN_EXPIRE_SECONDS": "900",
+        "REFRESH_TOKEN_EXPIRE_SECONDS": "86400",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{_workdir}/test.db",
+        "DATABASE_REPLICA_URLS": "",
+        "DATABASE_PING": "300",
+        "LOGIN_RATE_LIMIT_PER_IP": "0",
+        "LOGIN_RATE_LIMIT_PER_EMAIL": "0",
+        "RATE_LIMIT_BACKEND": "memory",
+        # Hash inline at bcrypt's minimum cost
+        "PASSWORD_HASH_WORKERS": "0",
+        "PASSWORD_HASH_FLOOR_ROUNDS": "4",
+        "PASSWORD_HASH_ROUNDS": "4",
+        "PASSWORD_HASH_MIN_ROUNDS": "4",
+        "LOG_FORMAT": "text",
+        "LOG_LEVEL": "WARNING",
+    }
+)
+
+import uuid  # noqa: E402
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as c:
+        yield c
+
+    # Pooled aiosqlite connections belong to this test's event loop
+    await database.engine.dispose()
+
+
+@pytest.fixture
+def register_and_login(client):
+    """Registers a new user and returns the tokens of a fresh login."""
+
+    async def register_and_login(email: str = None) -> dict:
+        email = email or f"user-{uuid.uuid4().hex[:12]}@example.com"
+        response = await client.post(
+            "/auth/register", json={"email": email, "password": PASSWORD}
+        )
+        assert response.status_code == 201, response.text
+        return await login(client, email)
+
+    return register_and_login
+
+
+async def login(client: httpx.AsyncClient, email: str) -> dict:
+    response = await client.post(
+        "/auth/jwt/login", data={"username": email, "password": PASSWORD}
+    )
+    assert response.status_code == 200, response.text
+    return {"email": email, **response.json()}
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,51 @@
+import pytest
+
+import database
+from benchmarks._common import metric_total
+from conftest import bearer
+from metrics import registry
+from user.models.user_models import User
+from user.database_adapter import UserDatabase
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_jwt_only_route_checks_out_no_connection(client, register_and_login):
+    tokens = await register_and_login()
+    checkouts = metric_total(registry, "db_pool_checkouts_total")
+
+    response = await client.get(
+        "/user/protected-route-only-jwt", headers=bearer(tokens["access_token"])
+    )
+
+    assert response.status_code == 200
+    assert metric_total(registry, "db_pool_checkouts_total") == checkouts
+
+
+async def test_jwt_only_route_rejects_a_bad_token_without_the_database(client):
+    checkouts = metric_total(registry, "db_pool_checkouts_total")
+
+    response = await client.get(
+        "/user/protected-route-only-jwt", headers=bearer("not-a-token")
+    )
+
+    assert response.status_code == 401
+    assert metric_total(registry, "db_pool_checkouts_total") == checkouts
+
+
+async def test_jwt_only_route_rejects_a_deactivated_user(client, register_and_login):
+    tokens = await register_and_login()
+    headers = bearer(tokens["access_token"])
+    assert (
+        await client.get("/user/protected-route-only-jwt", headers=headers)
+    ).status_code == 200
+
+    # Deactivating bumps the claims version, so the token's flags are stale
+    async with database.AsyncSessionLocal() as session:
+        user_db = UserDatabase(session, User)
+        user = await user_db.get_by_email(tokens["email"])
+        await user_db.update(user, {"is_active": False})
+
+    response = await client.get("/user/protected-route-only-jwt", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Inactive user"
@@ -0,0 +1,58 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from user.bulk_import import ImportResult, UnsupportedDatabaseError, UserImporter
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(text: str):
+    # Split mid-line on purpose: records must survive chunk boundaries
+    data = text.encode()
+    for start in range(0, len(data), 7):
+        yield data[start : start + 7]
+
+
+async def test_sqlite_import_reports_invalid_and_duplicate_rows(client):
+    domain = f"{uuid.uuid4().hex[:8]}.example.com"
+    text = (
+        "email,password\n"
+        f"a@{domain},secret-a\n"
+        f"not-an-email,secret-b\n"
+        f"b@{domain},secret-c\n"
+        f"A@{domain},secret-d\n"
+    )
+
+    async with database.AsyncSessionLocal() as session:
+        result = await UserImporter(session, batch_size=2).run(
+            chunks(text), "csv", ImportResult()
+        )
+    async with database.AsyncSessionLocal() as session:
+        again = await UserImporter(session).run(
+            chunks(f"email,password\nb@{domain},secret-e\n"), "csv", ImportResult()
+        )
+
+    assert (result.rows, result.imported, result.invalid, result.duplicates) == (
+        4,
+        2,
+        1,
+        1,
+    )
+    assert [error["line"] for error in result.errors] == [3, 5]
+    assert (again.imported, again.duplicates) == (0, 1)
+
+
+async def test_other_databases_are_rejected_before_reading_input():
+    session = SimpleNamespace(
+        bind=SimpleNamespace(dialect=SimpleNamespace(name="mysql"))
+    )
+
+    async def unread():
+        raise AssertionError("input read")
+        yield b""
+
+    with pytest.raises(UnsupportedDatabaseError):
+        await UserImporter(session).run(unread(), "ndjson", ImportResult())
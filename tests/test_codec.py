@@ -0,0 +1,67 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from fastapi_auth.codec import HMACTokenCodec
+from fastapi_auth.config import access_jwt_strategy, refresh_jwt_strategy
+from fastapi_auth.custom_dependency import refresh_token_codec
+from fastapi_auth.keys import access_key_set
+
+pytestmark = pytest.mark.anyio
+
+AUDIENCE = ["fastapi-users:auth"]
+
+
+def user():
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        is_active=True,
+        is_verified=False,
+        is_superuser=False,
+        claims_version=0,
+    )
+
+
+@pytest.fixture
+def no_pyjwt(monkeypatch):
+    def fail(self, *args):
+        raise AssertionError("fell back to pyjwt")
+
+    monkeypatch.setattr(HMACTokenCodec, "_decode_with_pyjwt", fail)
+
+
+async def test_issued_tokens_take_the_fast_path(no_pyjwt):
+    access_token = await access_jwt_strategy.write_token(user())
+    refresh_token = await refresh_jwt_strategy.write_token(user())
+
+    access = access_key_set.decode(access_token, AUDIENCE, "access")
+    refresh = refresh_token_codec.decode(refresh_token, AUDIENCE, "refresh")
+
+    assert access["iat"] <= time.time() and refresh["iat"] <= time.time()
+
+
+@pytest.mark.parametrize(
+    "iat, leeway, error",
+    [
+        (lambda now: now + 60, 0, jwt.ImmatureSignatureError),
+        (lambda now: now + 60, 120, None),
+        (lambda now: "soon", 0, jwt.InvalidIssuedAtError),
+    ],
+)
+def test_iat_is_checked_like_pyjwt(iat, leeway, error):
+    codec = HMACTokenCodec("secret", leeway=leeway)
+    now = int(time.time())
+    token = codec.encode({"aud": AUDIENCE, "iat": iat(now), "exp": now + 600})
+
+    for decode in (
+        lambda: codec.decode(token, AUDIENCE),
+        lambda: codec._decode_with_pyjwt(token, AUDIENCE, None),
+    ):
+        if error is None:
+            decode()
+        else:
+            with pytest.raises(error):
+                decode()
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from sqlalchemy import update
+
+import database
+import user.routers.user_routes as user_routes
+from conftest import bearer
+from user.database_adapter import user_cache
+from user.export import export_users
+from user.models.user_models import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def superuser_token(register_and_login):
+    tokens = await register_and_login()
+    await register_and_login()
+    async with database.engine.begin() as connection:
+        await connection.execute(
+            update(User.__table__)
+            .where(User.__table__.c.email == tokens["email"])
+            .values(is_superuser=True)
+        )
+    return tokens["access_token"]
+
+
+async def test_export_streams_users_without_password_hashes(client, superuser_token):
+    response = await client.get("/user/export", headers=bearer(superuser_token))
+
+    assert response.status_code == 200
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert len(users) >= 2
+    assert all("hashed_password" not in user for user in users)
+
+
+async def test_export_holds_one_connection_while_streaming(
+    client, superuser_token, monkeypatch
+):
+    # Without the user cache the guard's lookup really uses a connection
+    user_cache.clear()
+    monkeypatch.setattr(user_cache, "max_size", 0)
+    checked_out = []
+
+    async def observed_export(*args, **kwargs):
+        async for chunk in export_users(*args, batch_size=1, **kwargs):
+            checked_out.append(database.engine.sync_engine.pool.checkedout())
+            yield chunk
+
+    monkeypatch.setattr(user_routes, "export_users", observed_export)
+    response = await client.get("/user/export", headers=bearer(superuser_token))
+
+    assert response.status_code == 200
+    assert len(checked_out) >= 2
+    assert max(checked_out) == 1
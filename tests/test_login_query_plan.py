@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from sqlalchemy import inspect, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+from user.models.user_models import User
+from user.database_adapter import UserDatabase
+
+pytestmark = pytest.mark.anyio
+
+USERS = 2000
+
+
+class CapturingUserDatabase(UserDatabase):
+    # Keeps the statement fastapi-users builds instead of running it, so the
+    # test follows whatever the library version queries
+    statement = None
+
+    async def _get_user(self, statement):
+        self.statement = statement
+
+
+@pytest.fixture
+async def seeded(client):
+    # Other tests share the database, so every seeding gets its own emails
+    prefix = f"Plan-{uuid.uuid4().hex[:8]}"
+    async with database.engine.begin() as connection:
+        await connection.execute(
+            insert(User.__table__),
+            [
+                {
+                    "id": User().id,
+                    "email": f"{prefix}-{index}@Example.com",
+                    "hashed_password": "x",
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": False,
+                }
+                for index in range(USERS)
+            ],
+        )
+        await connection.execute(text('ANALYZE "user"'))
+    return prefix.lower()
+
+
+async def test_login_lookup_uses_the_lower_email_index(seeded):
+    capturing = CapturingUserDatabase(None, User)
+    await capturing.get_by_email(f"{seeded}-{USERS // 2}@example.com")
+    compiled = capturing.statement.compile(
+        dialect=database.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    async with database.engine.connect() as connection:
+        result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+        plan = "\n".join(str(row[-1]) for row in result)
+
+    assert "ix_user_email_lower" in plan
+
+
+async def test_redundant_id_index_is_gone(client):
+    async with database.engine.connect() as connection:
+        indexes = await connection.run_sync(
+            lambda sync: {index["name"] for index in inspect(sync).get_indexes("user")}
+        )
+
+    assert "ix_user_id" not in indexes
+
+
+async def test_login_lookup_ignores_case(seeded):
+    async with AsyncSession(database.engine) as session:
+        found = await UserDatabase(session, User).get_by_email(
+            f"{seeded.upper()}-{USERS // 2}@example.COM"
+        )
+
+    assert found is not None
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from sqlalchemy import select
+
+import database
+from conftest import PASSWORD, bearer
+from user.database_adapter import CachedUser, user_cache
+from user.models.outbox_models import OutboxEvent
+from user.outbox import OutboxWorker, enqueue, min_lease_seconds
+from user.user_manager import (
+    USER_FORGOT_PASSWORD,
+    USER_REQUEST_VERIFY,
+    handler_user_manager,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def test_lease_covers_a_worst_case_batch():
+    # 100 events, 10 at a time, 30 s each: ten waves of 30 s
+    assert min_lease_seconds(100, 10, 30) >= 300
+
+    worker = OutboxWorker(
+        batch_size=100, concurrency=10, handler_timeout=30, lease_seconds=120
+    )
+    assert worker.lease_seconds >= 300
+
+    # A longer configured lease is kept as is
+    worker = OutboxWorker(
+        batch_size=10, concurrency=10, handler_timeout=1, lease_seconds=600
+    )
+    assert worker.lease_seconds == 600
+
+
+async def test_claimed_events_stay_hidden_for_the_whole_batch(client):
+    async with database.AsyncSessionLocal() as session:
+        event = enqueue(session, "test.lease", {})
+        await session.commit()
+        event_id = event.id
+
+    worker = OutboxWorker(
+        batch_size=100, concurrency=10, handler_timeout=30, lease_seconds=1
+    )
+    started = time.time()
+    claimed = await worker.claim()
+
+    assert event_id in [claimed_event.id for claimed_event in claimed]
+    async with database.AsyncSessionLocal() as session:
+        available_at = (await session.get(OutboxEvent, event_id)).available_at
+    assert available_at >= started + 300
+
+
+async def event_payloads(event_type: str, email: str) -> list:
+    async with database.AsyncSessionLocal() as session:
+        events = await session.scalars(
+            select(OutboxEvent).where(OutboxEvent.event_type == event_type)
+        )
+        return [event.payload for event in events if event.payload["email"] == email]
+
+
+async def login_status(client, email: str, password: str) -> int:
+    response = await client.post(
+        "/auth/jwt/login", data={"username": email, "password": password}
+    )
+    return response.status_code
+
+
+async def test_events_hold_no_tokens_and_handlers_mint_them(client, register_and_login):
+    tokens = await register_and_login()
+    email = tokens["email"]
+
+    async with handler_user_manager() as manager:
+        user = await manager.get_by_email(email)
+        await manager.forgot_password(user)
+        await manager.request_verify(user)
+
+    for event_type in (USER_FORGOT_PASSWORD, USER_REQUEST_VERIFY):
+        (payload,) = await event_payloads(event_type, email)
+        assert payload == {"user_id": str(user.id), "email": email}
+
+    # Requests in between leave the user in the lookup cache
+    response = await client.post(
+        "/auth/jwt/refresh", headers=bearer(tokens["refresh_token"])
+    )
+    assert response.status_code == 200, response.text
+    assert isinstance(user_cache.get(user.id), CachedUser)
+
+    # What a handler sending the links does when it runs
+    async with handler_user_manager() as manager:
+        user = await manager.get_event_user(payload)
+        verification_token = await manager.verification_token(user)
+        reset_token = await manager.reset_password_token(user)
+
+        await manager.reset_password(reset_token, PASSWORD + " changed")
+        assert (await manager.verify(verification_token)).is_verified
+
+    assert await login_status(client, email, PASSWORD) == 401
+    assert await login_status(client, email, PASSWORD + " changed") == 200
@@ -0,0 +1,59 @@
+import pytest
+from fastapi_users.password import PasswordHelper
+
+from user import password
+from user.password import (
+    ExecutorPasswordHelper,
+    PasswordHashingExecutor,
+    make_context,
+    pick_rounds,
+)
+
+
+def cost(hashed: str) -> int:
+    return int(hashed.split("$")[2])
+
+
+@pytest.mark.parametrize(
+    "stored_rounds, upgrade_only, rehashed",
+    [
+        # A pinned cost is the target both ways
+        (4, False, True),
+        (5, False, False),
+        (6, False, True),
+        # A calibrated one only raises weaker hashes
+        (4, True, True),
+        (5, True, False),
+        (6, True, False),
+    ],
+)
+def test_rehash_follows_the_cost_mode(stored_rounds, upgrade_only, rehashed):
+    stored = PasswordHelper(make_context(stored_rounds)).hash("secret")
+
+    verified, updated = PasswordHelper(make_context(5, upgrade_only)).verify_and_update(
+        "secret", stored
+    )
+
+    assert verified
+    assert (updated is not None) == rehashed
+    if rehashed:
+        assert cost(updated) == 5
+
+
+def test_pick_rounds_stays_within_bounds():
+    # 10 ms at the minimum cost doubles per round: 12 -> 40 ms fits 50 ms
+    assert pick_rounds(0.010, 0.050, 10, 14) == 12
+    assert pick_rounds(0.500, 0.050, 10, 14) == 10
+    assert pick_rounds(0.0001, 10.0, 10, 14) == 14
+
+
+@pytest.mark.anyio
+async def test_calibration_stays_above_the_security_floor(monkeypatch):
+    monkeypatch.setattr(password, "PASSWORD_HASH_FLOOR_ROUNDS", 5)
+    helper = ExecutorPasswordHelper(PasswordHashingExecutor(max_workers=0))
+
+    # Nothing fits a 0 ms target, so calibration settles on its lowest cost
+    rounds = await helper.calibrate(target_ms=0, min_rounds=4, max_rounds=6, samples=1)
+
+    assert rounds == 5
+    assert helper.upgrade_only
@@ -0,0 +1,109 @@
+"""
+Read-replica routing against a second SQLite file.
+
+Nothing replicates between the primary and the "replica", which makes routing
+visible: a user registered on the primary cannot log in until the test copies
+the row over, and logs in again once the replica is marked down and reads fall
+back to the primary.
+"""
+
+import pytest
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+import database
+from conftest import PASSWORD, bearer
+from metrics import registry
+from user.models.user_models import User
+
+pytestmark = pytest.mark.anyio
+
+
+def statements_by_engine() -> dict:
+    counts = {}
+    for line in registry.render().splitlines():
+        if line.startswith("db_statement_duration_seconds_count"):
+            engine = line.split('engine="', 1)[1].split('"', 1)[0]
+            counts[engine] = counts.get(engine, 0) + int(float(line.rsplit(" ", 1)[1]))
+    return counts
+
+
+async def replicate(replica) -> None:
+    # Stand-in for streaming replication: copy the user table as it is now
+    async with database.engine.connect() as source:
+        rows = (await source.execute(select(User.__table__))).mappings().all()
+    async with replica.begin() as target:
+        await target.execute(delete(User.__table__))
+        await target.execute(insert(User.__table__), [dict(row) for row in rows])
+
+
+@pytest.fixture
+async def replica(client, monkeypatch, tmp_path):
+    # Configured here rather than through DATABASE_REPLICA_URLS so the other
+    # tests keep reading from the primary
+    engine = database.create_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/replica.db", "replica0"
+    )
+    async with engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+
+    replicas = database.ReplicaSet({"replica0": engine}, fallback=database.engine)
+    monkeypatch.setattr(database, "replicas", replicas)
+    monkeypatch.setattr(
+        database,
+        "ReadSessionLocal",
+        sessionmaker(
+            class_=AsyncSession,
+            sync_session_class=database.RoutingSession,
+            expire_on_commit=False,
+        ),
+    )
+    yield engine
+    await engine.dispose()
+
+
+async def test_reads_use_the_replica_and_writes_the_primary(client, replica):
+    email = "replica@example.com"
+    credentials = {"username": email, "password": PASSWORD}
+
+    response = await client.post(
+        "/auth/register", json={"email": email, "password": PASSWORD}
+    )
+    assert response.status_code == 201
+
+    before = statements_by_engine()
+    response = await client.post("/auth/jwt/login", data=credentials)
+    after = statements_by_engine()
+    # The replica has not seen the new user yet
+    assert response.status_code == 401
+    assert after.get("replica0", 0) > before.get("replica0", 0)
+    assert after.get("primary", 0) == before.get("primary", 0)
+
+    await replicate(replica)
+    response = await client.post("/auth/jwt/login", data=credentials)
+    assert response.status_code == 200
+    tokens = response.json()
+
+    before = statements_by_engine()
+    response = await client.delete("/user/me", headers=bearer(tokens["access_token"]))
+    after = statements_by_engine()
+    assert response.status_code == 204
+    assert after.get("replica0", 0) == before.get("replica0", 0)
+
+
+async def test_reads_fall_back_to_the_primary(client, replica):
+    email = "fallback@example.com"
+    response = await client.post(
+        "/auth/register", json={"email": email, "password": PASSWORD}
+    )
+    assert response.status_code == 201
+
+    # The replica is empty, so only a read from the primary finds the user
+    database.replicas.mark("replica0", healthy=False)
+    fallbacks = database.replicas.fallbacks
+    response = await client.post(
+        "/auth/jwt/login", data={"username": email, "password": PASSWORD}
+    )
+    assert response.status_code == 200
+    assert database.replicas.fallbacks > fallbacks
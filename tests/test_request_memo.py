@@ -0,0 +1,98 @@
+"""
+Token decodes and pool checkouts per request on routes with several guards.
+
+The token and user caches are disabled, so every decode and every user fetch
+would be visible. A route may decode its token once and check out only the
+connections its own work needs.
+"""
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Request
+from sqlalchemy import update
+
+import database
+from benchmarks._common import metric_total
+from conftest import bearer
+from fastapi_auth.auth import get_current_superuser
+from fastapi_auth.custom_dependency import JWTBearer, access_bearer, access_token_cache
+from fastapi_auth.keys import access_key_set
+from fastapi_auth.utils import get_token_user
+from metrics import registry
+from user.database_adapter import user_cache
+from user.models.user_models import User
+from user.user_manager import get_user_manager
+
+pytestmark = pytest.mark.anyio
+
+# Stacks a fresh JWTBearer, the shared access_bearer, get_current_superuser and a
+# route-level user lookup
+probe_app = FastAPI()
+
+
+@probe_app.get(
+    "/probe",
+    dependencies=[
+        Depends(JWTBearer(token_type="access")),
+        Depends(get_current_superuser),
+    ],
+)
+async def probe(
+    request: Request,
+    payload: dict = Depends(access_bearer),
+    user_manager_instance=Depends(get_user_manager),
+):
+    user = await get_token_user(payload, user_manager_instance, request)
+    return {"id": str(user.id)}
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    for cache in (access_token_cache, user_cache):
+        cache.clear()
+        monkeypatch.setattr(cache, "max_size", 0)
+
+    calls = []
+    decode = access_key_set.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(access_key_set, "decode", counting_decode)
+    return calls
+
+
+@pytest.fixture
+async def superuser_token(register_and_login):
+    tokens = await register_and_login()
+    async with database.engine.begin() as connection:
+        await connection.execute(
+            update(User.__table__)
+            .where(User.__table__.c.email == tokens["email"])
+            .values(is_superuser=True)
+        )
+    return tokens["access_token"]
+
+
+async def test_guards_share_one_decode_and_one_user_fetch(superuser_token, decodes):
+    transport = httpx.ASGITransport(app=probe_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as c:
+        checkouts = metric_total(registry, "db_pool_checkouts_total")
+        response = await c.get("/probe", headers=bearer(superuser_token))
+
+    assert response.status_code == 200
+    assert len(decodes) == 1
+    assert metric_total(registry, "db_pool_checkouts_total") - checkouts == 1
+
+
+async def test_delete_me_decodes_once_and_commits_once(
+    client, superuser_token, decodes
+):
+    checkouts = metric_total(registry, "db_pool_checkouts_total")
+    response = await client.delete("/user/me", headers=bearer(superuser_token))
+
+    assert response.status_code == 204
+    assert len(decodes) == 1
+    # The delete and the token cutoff share one transaction
+    assert metric_total(registry, "db_pool_checkouts_total") - checkouts == 1
@@ -0,0 +1,62 @@
+import jwt
+import pytest
+
+import database
+from conftest import bearer, login
+from fastapi_auth.models.token_models import RevokedToken
+from fastapi_auth.revocation import user_key
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_revoked_token_is_rejected(client, register_and_login):
+    tokens = await register_and_login()
+    other = await login(client, tokens["email"])
+
+    response = await client.post(
+        "/auth/jwt/revoke", headers=bearer(tokens["access_token"])
+    )
+    assert response.status_code == 204
+
+    response = await client.get(
+        "/auth/jwt/verify", headers=bearer(tokens["access_token"])
+    )
+    assert response.status_code == 401
+    # Only the presented token is revoked
+    response = await client.get(
+        "/auth/jwt/verify", headers=bearer(other["access_token"])
+    )
+    assert response.status_code == 200
+
+
+async def test_delete_revokes_every_token_of_the_user(client, register_and_login):
+    first = await register_and_login()
+    second = await login(client, first["email"])
+
+    response = await client.delete("/user/me", headers=bearer(first["access_token"]))
+    assert response.status_code == 204
+
+    for access_token in (first["access_token"], second["access_token"]):
+        response = await client.get(
+            "/user/protected-route-only-jwt", headers=bearer(access_token)
+        )
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+    response = await client.post(
+        "/auth/jwt/refresh", headers=bearer(second["refresh_token"])
+    )
+    assert response.status_code == 401
+
+
+async def test_delete_commits_the_cutoff_with_the_user(client, register_and_login):
+    tokens = await register_and_login()
+    claims = jwt.decode(tokens["access_token"], options={"verify_signature": False})
+
+    response = await client.delete("/user/me", headers=bearer(tokens["access_token"]))
+    assert response.status_code == 204
+
+    # Other workers learn the cutoff from the table
+    async with database.AsyncSessionLocal() as session:
+        cutoff = await session.get(RevokedToken, user_key(claims["sub"]))
+    assert cutoff is not None
+    assert cutoff.revoked_at >= claims["iat"]
@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import PASSWORD, bearer
+from user.database_adapter import CachedUser, user_cache
+from user.user_manager import handler_user_manager
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reset_password_works_while_the_user_is_cached(
+    client, register_and_login
+):
+    tokens = await register_and_login()
+    # An ordinary refresh looks the user up and leaves the cached view behind
+    response = await client.post(
+        "/auth/jwt/refresh", headers=bearer(tokens["refresh_token"])
+    )
+    assert response.status_code == 200, response.text
+
+    async with handler_user_manager() as manager:
+        user = await manager.get_by_email(tokens["email"])
+        assert isinstance(user_cache.get(user.id), CachedUser)
+
+        assert isinstance(await manager.get_cached(user.id), CachedUser)
+        assert (await manager.get(user.id)).hashed_password == user.hashed_password
+
+        token = await manager.reset_password_token(user)
+        await manager.reset_password(token, PASSWORD + " changed")
+
+    response = await client.post(
+        "/auth/jwt/login",
+        data={"username": tokens["email"], "password": PASSWORD + " changed"},
+    )
+    assert response.status_code == 200, response.text
@@ -0,0 +1,36 @@
+import pytest
+
+from fastapi_auth.custom_dependency import access_bearer
+from fastapi_auth.schemas.jwt_auth_schema import VERIFY_BATCH_MAX_TOKENS
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_verifies_each_token(client, register_and_login):
+    tokens = await register_and_login()
+
+    response = await client.post(
+        "/auth/jwt/verify-batch",
+        json={"tokens": [tokens["access_token"], "not-a-token"]},
+    )
+
+    assert response.status_code == 200, response.text
+    valid, invalid = response.json()["results"]
+    assert valid["valid"] and valid["claims"]["sub"]
+    assert not invalid["valid"] and invalid["error"]
+
+
+async def test_oversized_batch_is_rejected_by_the_schema(client, monkeypatch):
+    async def verify_token(token):
+        raise AssertionError("an oversized batch reached the route")
+
+    monkeypatch.setattr(access_bearer, "verify_token", verify_token)
+
+    response = await client.post(
+        "/auth/jwt/verify-batch",
+        json={"tokens": ["token"] * (VERIFY_BATCH_MAX_TOKENS + 1)},
+    )
+
+    assert response.status_code == 422
+    (error,) = response.json()["detail"]
+    assert error["type"] == "too_long"
@@ -0,0 +1,138 @@
+"""
+Per-request phase timing, reported as a Server-Timing header and as histograms.
+
+A sampled request gets a `RequestTimings` in a context variable; code on the
+request path wraps its phases in `span(name)` or reports a duration it already
+measured with `record(name, seconds)`. Outside a sampled request both cost one
+context variable lookup. Phases repeated within a request are summed.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from decouple import config
+
+from metrics import registry, route_template
+
+# Fraction of requests that are timed (0 turns timing off)
+SERVER_TIMING_SAMPLE_RATE = config("SERVER_TIMING_SAMPLE_RATE", default=1.0, cast=float)
+# Send the phases to clients in a Server-Timing header; the histograms are kept
+# either way. Turn off where clients should not see internal timings.
+SERVER_TIMING_HEADER = config("SERVER_TIMING_HEADER", default=True, cast=bool)
+
+REQUEST_PHASE_DURATION = registry.histogram(
+    "http_request_phase_duration_seconds",
+    "Time spent per phase of a sampled request, summed over the request.",
+    ("route", "phase"),
+)
+
+
+class RequestTimings:
+    __slots__ = ("started_at", "phases")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        # phase -> [seconds, count], in the order phases first finished
+        self.phases: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            phase[0] += seconds
+            phase[1] += 1
+
+    def header(self, total: float) -> bytes:
+        entries = [
+            f"{name};dur={seconds * 1000:.2f}"
+            + (f';desc="{count}x"' if count > 1 else "")
+            for name, (seconds, count) in self.phases.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries).encode("latin-1")
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record(name: str, seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+class span:
+    """Times the enclosed block as phase `name`; usable with `with` and `async with`."""
+
+    __slots__ = ("name", "timings", "started_at")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _current.get()
+        if self.timings is not None:
+            self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.started_at)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+class ServerTimingMiddleware:
+    """
+    Plain ASGI middleware that times sampled requests.
+
+    The header is added when the response starts, so it covers the phases that
+    ran before the first byte; the histograms are updated once the response is
+    complete.
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float = SERVER_TIMING_SAMPLE_RATE,
+        header: bool = SERVER_TIMING_HEADER,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.header:
+                total = time.perf_counter() - timings.started_at
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timings.header(total))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper if self.header else send)
+        finally:
+            _current.reset(token)
+            route = route_template(scope)
+            for name, (seconds, _) in timings.phases.items():
+                REQUEST_PHASE_DURATION.observe(seconds, route, name)
@@ -0,0 +1,392 @@
+"""
+Bulk user import from NDJSON or CSV.
+
+Input is read as a stream and handled in batches: each batch is validated,
+its passwords are hashed in the password worker processes and the rows are
+loaded with one COPY into a temporary staging table, then moved into `user`
+with `INSERT ... ON CONFLICT DO NOTHING` so existing emails are reported
+instead of failing the batch. Memory use depends on the batch size only.
+
+CSV input needs a header row with at least `email` and `password`; NDJSON has
+one object per line. `is_active` and `is_verified` are optional in both.
+
+    python -m user.bulk_import users.ndjson
+    python -m user.bulk_import users.csv --format csv --batch-size 2000
+"""
+
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from decouple import config
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from user.models.user_models import User
+from user.password import ExecutorPasswordHelper, password_helper
+from user.schemas.user_schemas import UserCreate
+
+# Rows hashed and loaded together; bounds the memory an import can use
+USER_IMPORT_BATCH_SIZE = config("USER_IMPORT_BATCH_SIZE", default=1000, cast=int)
+# Passwords per worker task. Small chunks let logins interleave with an import
+USER_IMPORT_HASH_CHUNK = config("USER_IMPORT_HASH_CHUNK", default=16, cast=int)
+
+FORMATS = ("ndjson", "csv")
+# PostgreSQL loads with COPY, SQLite row by row; other databases have neither path
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+COLUMNS = ("id", "email", "hashed_password", "is_active", "is_superuser", "is_verified")
+_TRUE = {"1", "true", "t", "yes", "y"}
+_FALSE = {"", "0", "false", "f", "no", "n"}
+
+# Filled per batch with COPY; ON COMMIT DELETE ROWS empties it after each batch
+_CREATE_STAGING = """
+CREATE TEMPORARY TABLE IF NOT EXISTS user_import_staging (
+    line integer NOT NULL,
+    id uuid NOT NULL,
+    email varchar(320) NOT NULL,
+    hashed_password varchar(1024) NOT NULL,
+    is_active boolean NOT NULL,
+    is_superuser boolean NOT NULL,
+    is_verified boolean NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+_MOVE_STAGED = """
+INSERT INTO "user" (id, email, hashed_password, is_active, is_superuser, is_verified)
+SELECT id, email, hashed_password, is_active, is_superuser, is_verified
+FROM user_import_staging
+ORDER BY line
+ON CONFLICT DO NOTHING
+RETURNING id
+"""
+
+
+class UnsupportedDatabaseError(RuntimeError):
+    pass
+
+
+class ImportRow:
+    __slots__ = ("line", "email", "password", "is_active", "is_verified")
+
+    def __init__(self, line, email, password, is_active, is_verified):
+        self.line = line
+        self.email = email
+        self.password = password
+        self.is_active = is_active
+        self.is_verified = is_verified
+
+
+class ImportResult:
+    """Counts and per-row errors; at most `max_errors` errors are kept."""
+
+    def __init__(self, max_errors: Optional[int] = 1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors: List[dict] = []
+        self.errors_truncated = False
+        self.started_at = time.perf_counter()
+
+    def error(self, line: int, email: Optional[str], reason: str) -> None:
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "email": email, "error": reason})
+        else:
+            self.errors_truncated = True
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "seconds": round(time.perf_counter() - self.started_at, 3),
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+        }
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Splits a byte stream into lines without holding more than one line
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _parse_bool(value, field: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        raise ValueError(f"{field} must be a boolean")
+    normalized = str(value).strip().lower()
+    if normalized in _TRUE:
+        return True
+    if normalized in _FALSE:
+        return False
+    raise ValueError(f"{field} must be a boolean")
+
+
+def build_row(line: int, record: Dict) -> ImportRow:
+    try:
+        user = UserCreate(email=record.get("email"), password=record.get("password"))
+    except ValidationError as e:
+        first = e.errors()[0]
+        field = ".".join(str(part) for part in first["loc"]) or "row"
+        raise ValueError(f"{field}: {first['msg']}")
+    if not user.password:
+        raise ValueError("password: must not be empty")
+
+    raw_active = record.get("is_active")
+    raw_verified = record.get("is_verified")
+    return ImportRow(
+        line,
+        user.email,
+        user.password,
+        True if raw_active in (None, "") else _parse_bool(raw_active, "is_active"),
+        (
+            False
+            if raw_verified in (None, "")
+            else _parse_bool(raw_verified, "is_verified")
+        ),
+    )
+
+
+async def iter_records(
+    lines: AsyncIterator[str], format: str
+) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Yields (line number, record, parse error) for every non-empty row."""
+    if format == "ndjson":
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "row must be a JSON object"
+                continue
+            yield line_number, record, None
+        return
+
+    header: Optional[List[str]] = None
+    line_number = 0
+    pending, pending_start = "", 0
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            pending_start = line_number
+            if not line.strip():
+                continue
+        pending = pending + "\n" + line if pending else line
+        if pending.count('"') % 2:
+            # A quoted field continues on the next line
+            continue
+
+        values = next(csv.reader([pending]))
+        pending = ""
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            missing = {"email", "password"} - set(header)
+            if missing:
+                raise ValueError(f"CSV header lacks {', '.join(sorted(missing))}")
+            continue
+        if len(values) != len(header):
+            yield pending_start, None, f"expected {len(header)} fields, got {len(values)}"
+            continue
+        yield pending_start, dict(zip(header, values)), None
+
+    if pending:
+        yield pending_start, None, "unterminated quoted field"
+
+
+class UserImporter:
+    def __init__(
+        self,
+        session: AsyncSession,
+        helper: ExecutorPasswordHelper = password_helper,
+        batch_size: int = USER_IMPORT_BATCH_SIZE,
+        hash_chunk: int = USER_IMPORT_HASH_CHUNK,
+        on_error: Optional[Callable[[dict], None]] = None,
+    ):
+        self.session = session
+        self.helper = helper
+        self.batch_size = max(1, batch_size)
+        self.hash_chunk = max(1, hash_chunk)
+        self.on_error = on_error
+        # Leave at least half of the hashing slots to logins and registrations
+        self._hash_slots = asyncio.Semaphore(
+            max(1, helper.executor.max_concurrency // 2)
+        )
+
+    def _error(self, result: ImportResult, line: int, email, reason: str) -> None:
+        result.error(line, email, reason)
+        if self.on_error is not None:
+            self.on_error({"line": line, "email": email, "error": reason})
+
+    async def _hash_chunk(self, passwords: List[str]) -> List[str]:
+        async with self._hash_slots:
+            return await self.helper.hash_many_async(passwords)
+
+    async def _hash(self, rows: List[ImportRow]) -> List[str]:
+        passwords = [row.password for row in rows]
+        chunks = [
+            passwords[start : start + self.hash_chunk]
+            for start in range(0, len(passwords), self.hash_chunk)
+        ]
+        hashed = await asyncio.gather(*(self._hash_chunk(chunk) for chunk in chunks))
+        return [value for chunk in hashed for value in chunk]
+
+    async def _load_postgres(self, records: List[tuple]) -> set:
+        connection = await self.session.connection()
+        await connection.execute(text(_CREATE_STAGING))
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "user_import_staging",
+            records=records,
+            columns=("line",) + COLUMNS,
+        )
+        inserted = await connection.execute(text(_MOVE_STAGED))
+        return {row[0] for row in inserted}
+
+    async def _load_sqlite(self, records: List[tuple]) -> set:
+        # SQLite, used in development, has no COPY: one INSERT per row
+        inserted = set()
+        for record in records:
+            values = dict(zip(COLUMNS, record[1:]))
+            statement = (
+                sqlite_insert(User.__table__).values(**values).on_conflict_do_nothing()
+            )
+            if (await self.session.execute(statement)).rowcount:
+                inserted.add(values["id"])
+        return inserted
+
+    async def _flush(self, rows: List[ImportRow], result: ImportResult) -> None:
+        hashed = await self._hash(rows)
+        records = [
+            (row.line, uuid.uuid4(), row.email, hashed_password)
+            + (row.is_active, False, row.is_verified)
+            for row, hashed_password in zip(rows, hashed)
+        ]
+
+        if self.session.bind.dialect.name == "postgresql":
+            inserted = await self._load_postgres(records)
+        else:
+            inserted = await self._load_sqlite(records)
+        await self.session.commit()
+
+        for row, record in zip(rows, records):
+            if record[1] in inserted:
+                result.imported += 1
+            else:
+                result.duplicates += 1
+                self._error(result, row.line, row.email, "email already registered")
+
+    async def run(
+        self, chunks: AsyncIterator[bytes], format: str, result: ImportResult
+    ) -> ImportResult:
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported format {format!r}, use ndjson or csv")
+        # Checked before any input is read or hashed
+        dialect = self.session.bind.dialect.name
+        if dialect not in SUPPORTED_DIALECTS:
+            raise UnsupportedDatabaseError(
+                f"Bulk import supports PostgreSQL and SQLite, not {dialect}"
+            )
+
+        batch: List[ImportRow] = []
+        seen_emails = set()
+        async for line, record, error in iter_records(iter_lines(chunks), format):
+            result.rows += 1
+            if error is None:
+                try:
+                    row = build_row(line, record)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                result.invalid += 1
+                self._error(result, line, (record or {}).get("email"), error)
+                continue
+
+            # Repeats inside one batch would be reported as a conflict only after
+            # hashing; catch them up front
+            key = row.email.lower()
+            if key in seen_emails:
+                result.duplicates += 1
+                self._error(result, line, row.email, "duplicate email in input")
+                continue
+            seen_emails.add(key)
+
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, result)
+                batch, seen_emails = [], set()
+
+        if batch:
+            await self._flush(batch, result)
+        return result
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    with sys.stdin.buffer if path == "-" else open(path, "rb") as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _guess_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+async def main(args) -> int:
+    from database import AsyncSessionLocal, engine
+    from user.password import hashing_executor
+
+    def report(error: dict) -> None:
+        print(json.dumps(error), file=sys.stderr)
+
+    result = ImportResult(max_errors=0)
+    try:
+        async with AsyncSessionLocal() as session:
+            importer = UserImporter(
+                session, batch_size=args.batch_size, on_error=report
+            )
+            await importer.run(
+                _read_file(args.path), args.format or _guess_format(args.path), result
+            )
+    finally:
+        hashing_executor.shutdown()
+        await engine.dispose()
+
+    summary = result.summary()
+    del summary["errors"], summary["errors_truncated"]
+    print(json.dumps(summary))
+    return 0 if not (result.invalid or result.duplicates) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the extension")
+    parser.add_argument("--batch-size", type=int, default=USER_IMPORT_BATCH_SIZE)
+    sys.exit(asyncio.run(main(parser.parse_args())))
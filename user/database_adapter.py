@@ -1,11 +1,219 @@
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from fastapi_users import exceptions
 from user.models.user_models import User
-from database import get_db
+from database import get_db, get_read_db
 from fastapi import Depends
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from user.models.user_models import User
+from fastapi_auth.cache import ExpiringLRUCache
+from fastapi_auth.claims import CLAIM_FLAGS, DELETED_VERSION, note_version
+from decouple import config
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+import json
+import time
+import uuid
+
+# How long a looked-up user may be served from memory, and how many are kept
+USER_CACHE_TTL_SECONDS = config("USER_CACHE_TTL_SECONDS", default=30, cast=int)
+USER_CACHE_MAX_SIZE = config("USER_CACHE_MAX_SIZE", default=10000, cast=int)
+
+
+class CachedUser(NamedTuple):
+    # Compact, read-only view of a user row: no password hash is kept in memory
+    id: uuid.UUID
+    email: str
+    is_active: bool
+    is_verified: bool
+    is_superuser: bool
+    claims_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_verified=user.is_verified,
+            is_superuser=user.is_superuser,
+            claims_version=user.claims_version or 0,
+        )
+
+
+# Shared by every request in the process; entries are keyed by user id
+user_cache = ExpiringLRUCache(max_size=USER_CACHE_MAX_SIZE)
+
+
+class UserDatabase(SQLAlchemyUserDatabase):
+    """
+    SQLAlchemyUserDatabase with a primary-key lookup cache in front of it.
+
+    `get_cached` serves `CachedUser` entries for up to USER_CACHE_TTL_SECONDS, and
+    every write (create, update, delete) drops the affected entry. `get` always
+    loads the row, since manager paths such as `reset_password` read the password
+    hash, which the cached view leaves out.
+    """
+
+    async def get(self, id: uuid.UUID) -> Optional[User]:
+        user = await super().get(id)
+        if user is not None:
+            note_version(user.id, user.claims_version or 0)
+            user_cache.set(
+                user.id, CachedUser.from_user(user), time.time() + USER_CACHE_TTL_SECONDS
+            )
+        return user
+
+    async def get_cached(self, id: uuid.UUID) -> Optional[Union[User, CachedUser]]:
+        # For token lookups, which only read the flags
+        cached = user_cache.get(id)
+        if cached is not None:
+            return cached
+        return await self.get(id)
+
+    async def get_many(
+        self, ids: Iterable[uuid.UUID]
+    ) -> Dict[uuid.UUID, Union[User, CachedUser]]:
+        # Cached users are served from memory, the rest in one `id IN (...)` query
+        found: Dict[uuid.UUID, Union[User, CachedUser]] = {}
+        missing = set()
+        for id in ids:
+            cached = user_cache.get(id)
+            if cached is not None:
+                found[id] = cached
+            else:
+                missing.add(id)
+
+        if missing:
+            statement = select(self.user_table).where(self.user_table.id.in_(missing))
+            results = await self.session.execute(statement)
+            expires_at = time.time() + USER_CACHE_TTL_SECONDS
+            for user in results.unique().scalars():
+                found[user.id] = user
+                note_version(user.id, user.claims_version or 0)
+                user_cache.set(user.id, CachedUser.from_user(user), expires_at)
+
+        return found
+
+    def _filtered(self, statement, filters: Dict[str, bool]):
+        for name, value in filters.items():
+            statement = statement.where(getattr(self.user_table, name) == value)
+        return statement
+
+    async def list_page(
+        self,
+        limit: int,
+        after: Optional[uuid.UUID] = None,
+        filters: Optional[Dict[str, bool]] = None,
+    ) -> List[User]:
+        # Keyset pagination on the primary key: each page is an index range scan
+        # starting where the previous one ended, whatever the page number
+        statement = self._filtered(select(self.user_table), filters or {})
+        if after is not None:
+            statement = statement.where(self.user_table.id > after)
+        statement = statement.order_by(self.user_table.id).limit(limit)
+        results = await self.session.execute(statement)
+        return list(results.unique().scalars())
+
+    async def estimate_count(
+        self, filters: Optional[Dict[str, bool]] = None
+    ) -> Optional[int]:
+        """
+        Row count from PostgreSQL planner statistics, without scanning the table.
+
+        Only as fresh as the last ANALYZE; None on other databases and on tables
+        that were never analyzed.
+        """
+        connection = await self.session.connection()
+        if connection.dialect.name != "postgresql":
+            return None
+        if not filters:
+            estimate = await connection.scalar(
+                text(
+                    "SELECT reltuples FROM pg_class " "WHERE oid = to_regclass(:table)"
+                ),
+                {"table": f'"{self.user_table.__tablename__}"'},
+            )
+            return None if estimate is None or estimate < 0 else int(estimate)
+
+        # The planner's row estimate for the filtered query, read from EXPLAIN
+        statement = self._filtered(select(self.user_table.id), filters)
+        compiled = statement.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        document = plan.scalar()
+        if isinstance(document, str):
+            document = json.loads(document)
+        return int(document[0]["Plan"]["Plan Rows"])
+
+    async def create(
+        self,
+        create_dict: Dict[str, Any],
+        before_commit: Optional[Callable[[User], Awaitable[None]]] = None,
+    ) -> User:
+        # `before_commit` runs with the new row pending in the session, so what it
+        # adds there (outbox events) is committed in the same transaction
+        user = self.user_table(**create_dict)
+        self.session.add(user)
+        if before_commit is not None:
+            await before_commit(user)
+        await self.session.commit()
+        await self.session.refresh(user)
+        user_cache.pop(user.id)
+        return user
+
+    async def update(
+        self, user: Union[User, CachedUser], update_dict: Dict[str, Any]
+    ) -> User:
+        model = await self._get_model(user)
+        if model is None:
+            user_cache.pop(user.id)
+            raise exceptions.UserNotExists()
+
+        if any(
+            name in update_dict and update_dict[name] != getattr(model, name)
+            for name in CLAIM_FLAGS
+        ):
+            # Tokens issued with the previous flags must not be trusted anymore
+            update_dict = {
+                **update_dict,
+                "claims_version": (model.claims_version or 0) + 1,
+            }
+
+        model = await super().update(model, update_dict)
+        user_cache.pop(model.id)
+        note_version(model.id, model.claims_version)
+        return model
+
+    async def delete(self, user: Union[User, CachedUser]) -> None:
+        model = await self._get_model(user)
+        if model is not None:
+            await super().delete(model)
+        user_cache.pop(user.id)
+        note_version(user.id, DELETED_VERSION)
+
+    async def _get_model(self, user: Union[User, CachedUser]) -> Optional[User]:
+        # Writes need a row mapped in this session, which a cache hit (or a user
+        # loaded through another session earlier in the request) is not
+        if isinstance(user, CachedUser) or user not in self.session:
+            return await self.session.get(self.user_table, user.id)
+        return user
 
 
 # Modify get_user_db to use the get_db dependency
 async def get_user_db(session: AsyncSession = Depends(get_db)):
-    return SQLAlchemyUserDatabase(session, User)
+    return UserDatabase(session, User)
+
+
+# Same adapter over a replica-routed session, for lookups on the hot auth paths
+async def get_read_user_db(session: AsyncSession = Depends(get_read_db)):
+    return UserDatabase(session, User)
@@ -0,0 +1,25 @@
+from sqlalchemy import JSON, BigInteger, Column, Float, Index, Integer, String, Text
+from database import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_event"
+
+    # SQLite only autoincrements an INTEGER PRIMARY KEY
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # Epoch seconds
+    created_at = Column(Float, nullable=False)
+    # Due for dispatch once this has passed. Pushed back while a worker holds the
+    # event and after a failed attempt; NULL once the event has run out of attempts.
+    available_at = Column(Float, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(Text, nullable=True)
+
+
+Index("ix_outbox_event_available_at", OutboxEvent.available_at)
@@ -1,5 +1,5 @@
 from fastapi_users.db import SQLAlchemyBaseUserTable
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, Integer, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from database import Base
@@ -9,8 +9,17 @@ import uuid
 class User(SQLAlchemyBaseUserTable, Base):
     __tablename__ = "user"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, index=True)
+    # The primary key is indexed already; a second index only slows inserts
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    # Bumped whenever is_active, is_verified or is_superuser changes, so access
+    # tokens carrying older flags are recognized as stale
+    claims_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.id = uuid.uuid4()
+
+
+# fastapi-users looks users up by `lower(email)`, which the plain unique index on
+# `email` cannot serve; this one also makes emails unique regardless of case
+Index("ix_user_email_lower", func.lower(User.email), unique=True)
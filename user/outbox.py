@@ -0,0 +1,259 @@
+"""
+Transactional outbox for side effects of user lifecycle events.
+
+`enqueue` adds an event to the caller's session, so it is committed or rolled
+back together with the change that caused it. `OutboxWorker` runs in the
+background, claims due events in batches and hands them to the handler
+registered for their type. Delivery is at least once: a handler may see the
+same event again after a crash or a lost commit, so it must be idempotent.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from decouple import config
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from metrics import registry
+from user.models.outbox_models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKER_ENABLED = config("OUTBOX_WORKER_ENABLED", default=True, cast=bool)
+# Events claimed per round trip, and handlers running at once
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=100, cast=int)
+OUTBOX_CONCURRENCY = config("OUTBOX_CONCURRENCY", default=10, cast=int)
+# Idle workers look for due events this often; events enqueued by this process
+# wake its worker at once
+OUTBOX_POLL_SECONDS = config("OUTBOX_POLL_SECONDS", default=1.0, cast=float)
+# Failed events are retried after OUTBOX_RETRY_BASE_SECONDS, doubling each time,
+# and parked once they failed OUTBOX_MAX_ATTEMPTS times
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=8, cast=int)
+OUTBOX_RETRY_BASE_SECONDS = config("OUTBOX_RETRY_BASE_SECONDS", default=2.0, cast=float)
+# A handler gets this long per event; claimed events stay hidden from other
+# workers for the lease, so a crashed worker's batch is picked up after it.
+# The lease is raised to at least the time a whole batch can take (see
+# `min_lease_seconds`), or events would be claimed again while still running.
+OUTBOX_HANDLER_TIMEOUT_SECONDS = config(
+    "OUTBOX_HANDLER_TIMEOUT_SECONDS", default=30.0, cast=float
+)
+OUTBOX_LEASE_SECONDS = config("OUTBOX_LEASE_SECONDS", default=120.0, cast=float)
+
+RETRY_MAX_SECONDS = 3600
+# Time to record the outcome of a batch once its last handler returned
+LEASE_MARGIN_SECONDS = 30
+
+OUTBOX_EVENTS = registry.counter(
+    "outbox_events_total",
+    "Outbox dispatch attempts by event type and result.",
+    ("event_type", "result"),
+)
+OUTBOX_DELIVERY_LAG = registry.histogram(
+    "outbox_delivery_lag_seconds",
+    "Time from enqueueing an event to its successful dispatch.",
+    ("event_type",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 3600),
+)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+handlers: Dict[str, Handler] = {}
+
+
+def handler(event_type: str) -> Callable[[Handler], Handler]:
+    """Registers the decorated coroutine function as the handler of `event_type`."""
+
+    def register(function: Handler) -> Handler:
+        handlers[event_type] = function
+        return function
+
+    return register
+
+
+def enqueue(
+    session: AsyncSession, event_type: str, payload: Dict[str, Any]
+) -> OutboxEvent:
+    # Only added to the session: the caller's commit makes it durable
+    now = time.time()
+    event = OutboxEvent(
+        event_type=event_type,
+        payload=payload,
+        created_at=now,
+        available_at=now,
+        attempts=0,
+    )
+    session.add(event)
+    return event
+
+
+def min_lease_seconds(
+    batch_size: int, concurrency: int, handler_timeout: float
+) -> float:
+    # Handlers run in waves of `concurrency`, each wave taking up to the timeout
+    waves = math.ceil(max(batch_size, 1) / max(concurrency, 1))
+    return waves * handler_timeout + LEASE_MARGIN_SECONDS
+
+
+def retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+        handler_timeout: float = OUTBOX_HANDLER_TIMEOUT_SECONDS,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.handler_timeout = handler_timeout
+        self.lease_seconds = max(
+            lease_seconds,
+            min_lease_seconds(batch_size, self.concurrency, handler_timeout),
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # Lets the batch in flight finish; events it does not get to stay claimed
+        # until their lease runs out and are dispatched by the next worker
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox worker did not stop within %s seconds.", timeout)
+        self._task = None
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            # Cleared before claiming, so events enqueued meanwhile are not missed
+            self._wakeup.clear()
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Error dispatching outbox events: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim(self) -> List[OutboxEvent]:
+        now = time.time()
+        async with self.session_factory() as session:
+            # SKIP LOCKED lets several workers claim disjoint batches on PostgreSQL;
+            # SQLite serializes writers anyway and ignores it
+            statement = (
+                select(OutboxEvent)
+                .where(OutboxEvent.available_at <= now)
+                .order_by(OutboxEvent.available_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = list((await session.execute(statement)).scalars())
+            if events:
+                await session.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_([event.id for event in events]))
+                    .values(available_at=now + self.lease_seconds)
+                )
+            await session.commit()
+        return events
+
+    async def _dispatch(
+        self, event: OutboxEvent, semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        # Returns the error, or None once the handler succeeded
+        function = handlers.get(event.event_type)
+        if function is None:
+            return f"No handler for event type {event.event_type!r}"
+        async with semaphore:
+            try:
+                await asyncio.wait_for(function(event.payload), self.handler_timeout)
+            except Exception as e:
+                logger.warning(
+                    "Outbox event %s (%s) failed: %r", event.id, event.event_type, e
+                )
+                return repr(e)[:1000]
+        return None
+
+    async def run_once(self) -> int:
+        """Claims one batch of due events and dispatches it; returns the batch size."""
+        events = await self.claim()
+        if not events:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(
+            *(self._dispatch(event, semaphore) for event in events)
+        )
+
+        now = time.time()
+        delivered = []
+        failed = []
+        for event, error in zip(events, errors):
+            if error is None:
+                delivered.append(event.id)
+                OUTBOX_EVENTS.inc(event.event_type, "delivered")
+                OUTBOX_DELIVERY_LAG.observe(now - event.created_at, event.event_type)
+                continue
+            attempts = event.attempts + 1
+            parked = attempts >= self.max_attempts
+            failed.append(
+                {
+                    "id": event.id,
+                    "attempts": attempts,
+                    "last_error": error,
+                    "available_at": None if parked else now + retry_delay(attempts),
+                }
+            )
+            OUTBOX_EVENTS.inc(event.event_type, "dead" if parked else "retried")
+            if parked:
+                logger.error(
+                    "Outbox event %s (%s) gave up after %s attempts.",
+                    event.id,
+                    event.event_type,
+                    attempts,
+                )
+
+        async with self.session_factory() as session:
+            if delivered:
+                await session.execute(
+                    delete(OutboxEvent).where(OutboxEvent.id.in_(delivered))
+                )
+            if failed:
+                # Bulk UPDATE by primary key, one executemany for the whole batch
+                await session.execute(update(OutboxEvent), failed)
+            await session.commit()
+        return len(events)
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,319 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from decouple import config
+from fastapi import HTTPException, status
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+from timing import record
+
+# Worker processes used for bcrypt (0 runs hashing inline on the event loop)
+PASSWORD_HASH_WORKERS = config(
+    "PASSWORD_HASH_WORKERS", default=multiprocessing.cpu_count(), cast=int
+)
+# Hash operations allowed to run at once, and how many may wait behind them
+PASSWORD_HASH_MAX_CONCURRENCY = config(
+    "PASSWORD_HASH_MAX_CONCURRENCY", default=max(PASSWORD_HASH_WORKERS, 1), cast=int
+)
+PASSWORD_HASH_MAX_QUEUE = config("PASSWORD_HASH_MAX_QUEUE", default=64, cast=int)
+# passlib's bcrypt default
+DEFAULT_ROUNDS = 12
+# Security floor: no password is ever hashed with a lower cost, whether the cost
+# is pinned or calibrated
+PASSWORD_HASH_FLOOR_ROUNDS = config("PASSWORD_HASH_FLOOR_ROUNDS", default=10, cast=int)
+# bcrypt cost. Pinned by default, so instances of different sizes sharing a
+# database agree on it, and stored hashes of any other cost are rehashed to it.
+# 0 calibrates it at startup instead, to the largest cost whose hash fits in
+# PASSWORD_HASH_TARGET_MS within PASSWORD_HASH_MIN/MAX_ROUNDS (the calibration
+# range, never below the floor).
+PASSWORD_HASH_ROUNDS = config("PASSWORD_HASH_ROUNDS", default=DEFAULT_ROUNDS, cast=int)
+PASSWORD_HASH_TARGET_MS = config("PASSWORD_HASH_TARGET_MS", default=250, cast=float)
+PASSWORD_HASH_MIN_ROUNDS = config(
+    "PASSWORD_HASH_MIN_ROUNDS", default=PASSWORD_HASH_FLOOR_ROUNDS, cast=int
+)
+PASSWORD_HASH_MAX_ROUNDS = config("PASSWORD_HASH_MAX_ROUNDS", default=14, cast=int)
+
+if PASSWORD_HASH_ROUNDS and PASSWORD_HASH_ROUNDS < PASSWORD_HASH_FLOOR_ROUNDS:
+    raise ValueError(
+        f"PASSWORD_HASH_ROUNDS={PASSWORD_HASH_ROUNDS} is below "
+        f"PASSWORD_HASH_FLOOR_ROUNDS={PASSWORD_HASH_FLOOR_ROUNDS}"
+    )
+
+
+def make_context(rounds: int, upgrade_only: bool = False) -> CryptContext:
+    # verify_and_update returns a new hash for stored hashes whose cost is outside
+    # [min_rounds, max_rounds], and the next successful login stores it. A pinned
+    # cost is the target both ways, so lowering it also lowers existing hashes.
+    # A calibrated cost (`upgrade_only`) only raises weaker hashes: instances of
+    # different sizes calibrate differently and would rehash back and forth.
+    bounds = {"bcrypt__min_rounds": rounds}
+    if not upgrade_only:
+        bounds["bcrypt__max_rounds"] = rounds
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        **bounds,
+    )
+
+
+# Functions below run inside the worker processes, so they must stay picklable
+# module-level callables and build their own PasswordHelper. The cost travels
+# with every call, so workers never need to be told about a new one.
+_worker_password_helpers: Dict[Tuple[int, bool], PasswordHelper] = {}
+
+
+def _get_worker_password_helper(
+    rounds: int, upgrade_only: bool = False
+) -> PasswordHelper:
+    helper = _worker_password_helpers.get((rounds, upgrade_only))
+    if helper is None:
+        helper = PasswordHelper(make_context(rounds, upgrade_only))
+        _worker_password_helpers[(rounds, upgrade_only)] = helper
+    return helper
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _get_worker_password_helper(rounds).hash(password)
+
+
+def _hash_many(passwords: List[str], rounds: int) -> List[str]:
+    # One task per chunk keeps pickling and queueing overhead off bulk imports
+    helper = _get_worker_password_helper(rounds)
+    return [helper.hash(password) for password in passwords]
+
+
+def _verify_and_update(
+    plain_password: str, hashed_password: str, rounds: int, upgrade_only: bool
+) -> Tuple[bool, Optional[str]]:
+    return _get_worker_password_helper(rounds, upgrade_only).verify_and_update(
+        plain_password, hashed_password
+    )
+
+
+def _time_hash(rounds: int, samples: int) -> float:
+    # Fastest of a few runs: slower ones measure other load, not bcrypt
+    helper = _get_worker_password_helper(rounds)
+    fastest = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        helper.hash("calibration-password")
+        fastest = min(fastest, time.perf_counter() - started)
+    return fastest
+
+
+def pick_rounds(
+    seconds_at_min: float, target_seconds: float, min_rounds: int, max_rounds: int
+) -> int:
+    """Largest cost whose estimated hash time fits the target; each round doubles it."""
+    rounds = min_rounds
+    while rounds < max_rounds and seconds_at_min * 2 ** (rounds + 1 - min_rounds) <= (
+        target_seconds
+    ):
+        rounds += 1
+    return rounds
+
+
+class PasswordHashingExecutor:
+    """
+    Runs password hashing off the event loop in a bounded process pool.
+
+    At most `max_concurrency` operations run at once and at most `max_queue`
+    wait for a slot; anything beyond that is rejected with a 503 so a login
+    burst cannot pile up unbounded work.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_concurrency: int = PASSWORD_HASH_MAX_CONCURRENCY,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+    ):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        if self._pool is None:
+            # "spawn" keeps workers from inheriting the event loop and open sockets
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations. Retry later.",
+                headers={"Retry-After": "1"},
+            )
+
+        if self._semaphore is None:
+            # Created on first use so it belongs to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.wait_seconds_total += started_at - queued_at
+        record("password_wait", started_at - queued_at)
+        self.in_flight += 1
+        try:
+            pool = self._get_pool()
+            if pool is None:
+                result = func(*args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    pool, func, *args
+                )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            ran = time.perf_counter() - started_at
+            self.run_seconds_total += ran
+            record("password_hash", ran)
+            self._semaphore.release()
+
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "wait_seconds_total": self.wait_seconds_total,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+
+class ExecutorPasswordHelper(PasswordHelper):
+    """
+    PasswordHelper with awaitable variants that go through the hashing executor.
+
+    The synchronous methods are kept so fastapi-users code paths that still call
+    them keep working. All of them hash with the current `rounds`.
+    """
+
+    def __init__(
+        self,
+        executor: PasswordHashingExecutor,
+        rounds: int = DEFAULT_ROUNDS,
+        upgrade_only: bool = False,
+    ):
+        super().__init__(make_context(rounds, upgrade_only))
+        self.executor = executor
+        self.rounds = rounds
+        self.upgrade_only = upgrade_only
+        self.calibration: Optional[dict] = None
+        self.rehashes = 0
+
+    def set_rounds(self, rounds: int, upgrade_only: bool = False) -> None:
+        self.rounds = rounds
+        self.upgrade_only = upgrade_only
+        self.context = make_context(rounds, upgrade_only)
+
+    async def calibrate(
+        self,
+        target_ms: float = PASSWORD_HASH_TARGET_MS,
+        min_rounds: int = PASSWORD_HASH_MIN_ROUNDS,
+        max_rounds: int = PASSWORD_HASH_MAX_ROUNDS,
+        samples: int = 3,
+    ) -> int:
+        """
+        Times bcrypt at `min_rounds` where hashes really run (a worker process)
+        and switches to the largest cost that fits `target_ms`, never below
+        PASSWORD_HASH_FLOOR_ROUNDS. Stored hashes are then only rehashed upwards.
+        """
+        min_rounds = max(min_rounds, PASSWORD_HASH_FLOOR_ROUNDS)
+        max_rounds = max(max_rounds, min_rounds)
+        seconds = await self.executor.run(_time_hash, min_rounds, samples)
+        rounds = pick_rounds(seconds, target_ms / 1000, min_rounds, max_rounds)
+        self.calibration = {
+            "target_ms": target_ms,
+            "measured_ms_at_min_rounds": seconds * 1000,
+            "min_rounds": min_rounds,
+            "max_rounds": max_rounds,
+            "estimated_ms": seconds * 1000 * 2 ** (rounds - min_rounds),
+        }
+        self.set_rounds(rounds, upgrade_only=True)
+        return rounds
+
+    async def hash_async(self, password: str) -> str:
+        return await self.executor.run(_hash, password, self.rounds)
+
+    async def hash_many_async(self, passwords: List[str]) -> List[str]:
+        return await self.executor.run(_hash_many, passwords, self.rounds)
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        verified, updated_password_hash = await self.executor.run(
+            _verify_and_update,
+            plain_password,
+            hashed_password,
+            self.rounds,
+            self.upgrade_only,
+        )
+        if updated_password_hash is not None:
+            self.rehashes += 1
+        return verified, updated_password_hash
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "upgrade_only": self.upgrade_only,
+            "rehashes": self.rehashes,
+            "calibration": self.calibration,
+        }
+
+
+hashing_executor = PasswordHashingExecutor()
+password_helper = ExecutorPasswordHelper(
+    hashing_executor,
+    PASSWORD_HASH_ROUNDS or DEFAULT_ROUNDS,
+    upgrade_only=not PASSWORD_HASH_ROUNDS,
+)
+
+
+async def configure_rounds() -> int:
+    # Startup hook: calibrates only when PASSWORD_HASH_ROUNDS is 0
+    if PASSWORD_HASH_ROUNDS:
+        return password_helper.rounds
+    return await password_helper.calibrate()
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi_users import models, BaseUserManager
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
+from fastapi_auth.auth import active_user_claims, get_current_superuser
+from user.bulk_import import ImportResult, UnsupportedDatabaseError, UserImporter
+from user.export import MEDIA_TYPES, export_users
+from user.database_adapter import UserDatabase, get_read_user_db
+from user.schemas.user_schemas import UserDB, UserPage
+from typing import Optional
+import base64
+import binascii
+import uuid
 from user.user_manager import get_user_manager
 from fastapi import Request
-from fastapi_auth.custom_dependency import JWTBearer
+from fastapi.responses import StreamingResponse
+from fastapi_auth.custom_dependency import access_bearer
 from fastapi_auth.utils import get_token_user
-
+from fastapi_auth.revocation import revocation_list
 
 user_routers = APIRouter()
 
 
+# Authorized from the flags in the token while they are fresh: no database access
 @user_routers.get(
     "/protected-route-only-jwt",
-    dependencies=[Depends(JWTBearer(token_type="access"))],
+    dependencies=[Depends(active_user_claims)],
 )
 def protected_route():
     return f"Hello. You are authenticated with a JWT."
@@ -19,7 +32,7 @@ def protected_route():
 
 @user_routers.delete(
     "/me",
-    dependencies=[Depends(JWTBearer(token_type="access"))],
+    dependencies=[Depends(access_bearer)],
     status_code=status.HTTP_204_NO_CONTENT,
     responses={
         status.HTTP_401_UNAUTHORIZED: {
@@ -53,13 +66,156 @@ def protected_route():
     },
 )
 async def delete_own_account(
-    payload: dict = Depends(JWTBearer(token_type="access")),
+    request: Request,
+    payload: dict = Depends(access_bearer),
     user_manager_instance: BaseUserManager[models.UP, models.ID] = Depends(
         get_user_manager
     ),
 ):
 
-    user = await get_token_user(payload, user_manager_instance)
+    user = await get_token_user(payload, user_manager_instance, request)
+    user_db = user_manager_instance.user_db
 
-    await user_manager_instance.user_db.delete(user)
+    # Every token issued to the user so far must stop working now, not when it
+    # expires. The delete commits the cutoff, so both happen or neither does.
+    cutoff = await revocation_list.stage_user_cutoff(user_db.session, user.id)
+    await user_db.delete(user)
+    revocation_list.remember(cutoff.jti, cutoff.revoked_at, cutoff.expires_at)
     return None
+
+
+@user_routers.post(
+    "/import",
+    dependencies=[Depends(get_current_superuser)],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Unreadable input, e.g. a CSV header without email or password.",
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Superuser privileges required.",
+        },
+        status.HTTP_501_NOT_IMPLEMENTED: {
+            "description": "Bulk import is not supported on this database.",
+        },
+    },
+)
+async def import_users(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    max_errors: int = Query(1000, ge=0),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Creates users from an NDJSON or CSV request body, in batches.
+
+    Rows that fail validation or whose email is already registered are skipped
+    and reported by line number; every other row is imported.
+    """
+    result = ImportResult(max_errors=max_errors)
+    try:
+        await UserImporter(session).run(request.stream(), format, result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UnsupportedDatabaseError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    return result.summary()
+
+
+@user_routers.get(
+    "/export",
+    dependencies=[Depends(get_current_superuser)],
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Users as NDJSON or CSV, streamed.",
+            "content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Superuser privileges required.",
+        },
+    },
+)
+async def export_users_route(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    is_active: Optional[bool] = None,
+    is_verified: Optional[bool] = None,
+    guard_session: AsyncSession = Depends(get_read_db),
+):
+    """
+    Streams every user, optionally filtered by `is_active` and `is_verified`.
+    """
+    # Dependencies are cached per request, so this is the session the superuser
+    # check ran on. It would only be closed after the whole body is sent; release
+    # its connection now, leaving the export's own session as the only one held.
+    await guard_session.close()
+    return StreamingResponse(
+        export_users(format, is_active, is_verified),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+def _encode_cursor(user_id: uuid.UUID) -> str:
+    # The last id of the page; opaque to clients, who only echo it back
+    return base64.urlsafe_b64encode(user_id.bytes).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(
+            bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+@user_routers.get(
+    "/",
+    response_model=UserPage,
+    dependencies=[Depends(get_current_superuser)],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Invalid cursor.",
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Superuser privileges required.",
+        },
+    },
+)
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    is_active: Optional[bool] = None,
+    is_verified: Optional[bool] = None,
+    is_superuser: Optional[bool] = None,
+    include_total: bool = False,
+    user_db: UserDatabase = Depends(get_read_user_db),
+):
+    """
+    Lists users ordered by id, one page at a time.
+
+    Pass `next_cursor` from a response as `cursor` to get the following page,
+    with the same filters. `include_total` adds an estimate of the matching
+    users from the database statistics (PostgreSQL only).
+    """
+    filters = {
+        name: value
+        for name, value in (
+            ("is_active", is_active),
+            ("is_verified", is_verified),
+            ("is_superuser", is_superuser),
+        )
+        if value is not None
+    }
+    after = _decode_cursor(cursor) if cursor else None
+
+    # One extra row tells whether there is a next page
+    users = await user_db.list_page(limit + 1, after, filters)
+    next_cursor = _encode_cursor(users[limit - 1].id) if len(users) > limit else None
+    return UserPage(
+        items=[UserDB.model_validate(user) for user in users[:limit]],
+        next_cursor=next_cursor,
+        total_estimate=await user_db.estimate_count(filters) if include_total else None,
+    )
@@ -1,4 +1,6 @@
 from fastapi_users import schemas
+from pydantic import BaseModel
+from typing import List, Optional
 import uuid
 
 
@@ -12,3 +14,11 @@ class UserCreate(schemas.BaseUserCreate):
 
 class UserUpdate(schemas.BaseUserUpdate):
     pass
+
+
+class UserPage(BaseModel):
+    items: List[UserDB]
+    # Pass as `cursor` to get the next page; None on the last page
+    next_cursor: Optional[str] = None
+    # Planner estimate of the matching users, only when asked for
+    total_estimate: Optional[int] = None
@@ -1,38 +1,244 @@
-from fastapi_users import BaseUserManager, UUIDIDMixin
+from fastapi_users import BaseUserManager, UUIDIDMixin, exceptions, models, schemas
+from fastapi_users.jwt import generate_jwt
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
+import logging
 import uuid
-from typing import Optional
-from user.database_adapter import get_user_db
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Union
+from database import AsyncSessionLocal
+from user.database_adapter import (
+    CachedUser,
+    UserDatabase,
+    get_read_user_db,
+    get_user_db,
+)
 from fastapi_users.db import SQLAlchemyUserDatabase
 from user.models.user_models import User
+from user.password import ExecutorPasswordHelper, password_helper
+from user.outbox import enqueue, handler, outbox_worker
+
+logger = logging.getLogger(__name__)
+
+# Outbox event types published by the lifecycle hooks below
+USER_REGISTERED = "user.registered"
+USER_FORGOT_PASSWORD = "user.forgot_password"
+USER_REQUEST_VERIFY = "user.request_verify"
 
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = "SECRET"
     verification_token_secret = "SECRET"
 
+    password_helper: ExecutorPasswordHelper
+
+    async def get_cached(self, id: uuid.UUID) -> Union[User, CachedUser]:
+        """Like `get`, but may return the cached view, which has no password hash."""
+        user = await self.user_db.get_cached(id)
+        if user is None:
+            raise exceptions.UserNotExists()
+        return user
+
+    # Password hashing is CPU bound, so the overrides below await the hashing
+    # executor instead of calling the synchronous password helper on the event loop
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[models.UP]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher to mitigate timing attack
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        verified, updated_password_hash = (
+            await self.password_helper.verify_and_update_async(
+                credentials.password, user.hashed_password
+            )
+        )
+        if not verified:
+            return None
+        # Update password hash to a more robust one if needed
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
+    async def create(
+        self,
+        user_create: schemas.UC,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> models.UP:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.password_helper.hash_async(password)
+
+        # The hook runs before the commit, so the user and its registration event
+        # are stored together or not at all
+        created_user = await self.user_db.create(
+            user_dict,
+            before_commit=lambda user: self.on_after_register(user, request),
+        )
+
+        return created_user
+
+    async def _update(self, user: models.UP, update_dict: Dict[str, Any]) -> models.UP:
+        password = update_dict.get("password")
+        if password is not None:
+            # Hash here so the base implementation only sees the finished hash
+            await self.validate_password(password, user)
+            update_dict = {k: v for k, v in update_dict.items() if k != "password"}
+            update_dict["hashed_password"] = await self.password_helper.hash_async(
+                password
+            )
+
+        return await super()._update(user, update_dict)
+
+    # Reset and verification tokens are never stored with an event, where they
+    # would sit in plain text until delivered (or for good, once parked). The
+    # handler that sends one mints it with the methods below when it runs, so
+    # the requests only check the user and record the event.
+
+    async def forgot_password(
+        self, user: models.UP, request: Optional[Request] = None
+    ) -> None:
+        if not user.is_active:
+            raise exceptions.UserInactive()
+        await self.on_after_forgot_password(user, None, request)
+
+    async def request_verify(
+        self, user: models.UP, request: Optional[Request] = None
+    ) -> None:
+        if not user.is_active:
+            raise exceptions.UserInactive()
+        if user.is_verified:
+            raise exceptions.UserAlreadyVerified()
+        await self.on_after_request_verify(user, None, request)
+
+    async def get_event_user(self, payload: Dict[str, Any]) -> Optional[User]:
+        # The full row rather than the cached view: a reset token needs the
+        # password hash. None once the user is gone or the email was reassigned.
+        user = await self.user_db.get_by_email(payload["email"])
+        if user is None or str(user.id) != payload["user_id"]:
+            return None
+        return user
+
+    async def reset_password_token(self, user: User) -> str:
+        # Same claims as `forgot_password` in fastapi-users, so `reset_password`
+        # accepts it; changing the password invalidates it
+        token_data = {
+            "sub": str(user.id),
+            "password_fgpt": await self.password_helper.hash_async(
+                user.hashed_password
+            ),
+            "aud": self.reset_password_token_audience,
+        }
+        return generate_jwt(
+            token_data,
+            self.reset_password_token_secret,
+            self.reset_password_token_lifetime_seconds,
+        )
+
+    async def verification_token(self, user: User) -> str:
+        token_data = {
+            "sub": str(user.id),
+            "email": user.email,
+            "aud": self.verification_token_audience,
+        }
+        return generate_jwt(
+            token_data,
+            self.verification_token_secret,
+            self.verification_token_lifetime_seconds,
+        )
+
+    # The hooks only record an event; its side effects run in the outbox worker,
+    # outside the request
+
+    async def _publish(self, event_type: str, payload: Dict[str, Any]) -> None:
+        # Commits whatever else the session has pending along with the event
+        enqueue(self.user_db.session, event_type, payload)
+        await self.user_db.session.commit()
+        outbox_worker.notify()
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
-        print(f"User {user.id} has registered.")
+        await self._publish(
+            USER_REGISTERED, {"user_id": str(user.id), "email": user.email}
+        )
 
     async def on_after_forgot_password(
-        self, user: User, token: str, request: Optional[Request] = None
+        self, user: User, token: Optional[str], request: Optional[Request] = None
     ):
-        print(f"User {user.id} has forgot their password. Reset token: {token}")
+        # No token: the handler mints one with `reset_password_token`
+        await self._publish(
+            USER_FORGOT_PASSWORD, {"user_id": str(user.id), "email": user.email}
+        )
 
     async def on_after_request_verify(
-        self, user: User, token: str, request: Optional[Request] = None
+        self, user: User, token: Optional[str], request: Optional[Request] = None
     ):
-        print(f"Verification requested for user {user.id}. Verification token: {token}")
+        await self._publish(
+            USER_REQUEST_VERIFY, {"user_id": str(user.id), "email": user.email}
+        )
+
+
+@asynccontextmanager
+async def handler_user_manager() -> AsyncIterator[UserManager]:
+    """A UserManager on its own primary session, for outbox handlers."""
+    async with AsyncSessionLocal() as session:
+        yield UserManager(UserDatabase(session, User), password_helper)
+
+
+# Default handlers; replace them to send emails or call webhooks. A handler that
+# sends a reset link gets its token with
+#
+#     async with handler_user_manager() as manager:
+#         user = await manager.get_event_user(payload)
+#         if user is not None:
+#             token = await manager.reset_password_token(user)
+
+
+@handler(USER_REGISTERED)
+async def log_registered(payload: Dict[str, Any]):
+    logger.info("User %s has registered.", payload["user_id"])
+
+
+@handler(USER_FORGOT_PASSWORD)
+async def log_forgot_password(payload: Dict[str, Any]):
+    logger.info("User %s has forgot their password.", payload["user_id"])
+
+
+@handler(USER_REQUEST_VERIFY)
+async def log_request_verify(payload: Dict[str, Any]):
+    logger.info("Verification requested for user %s.", payload["user_id"])
 
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
+
+
+# Reads from a replica; a password rehash on login still writes to the primary
+async def get_read_user_manager(
+    user_db: SQLAlchemyUserDatabase = Depends(get_read_user_db),
+):
+    yield UserManager(user_db, password_helper)
 
 
 async def get_user_manager_instance(
     user_db: SQLAlchemyUserDatabase = Depends(get_user_db),
 ):
-    return UserManager(user_db)
+    return UserManager(user_db, password_helper)
 
 
 # Custom UserManager class
@@ -42,4 +248,4 @@ class CustomUserManager(UserManager):
 
 
 async def get_custom_user_manager(user_db=Depends(get_user_db)):
-    yield CustomUserManager(user_db)
+    yield CustomUserManager(user_db, password_helper)